@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import logging
+import sys
+import time
+import tracemalloc
+
+import machine
+import peephole
+import translator
+
+# Блок из 11 термов: арифметика, ветвление и литералы
+SOURCE_BLOCK = "1 2 + dup if drop 3 else 4 then drop"
+SOURCE_BLOCK_TERMS = 11
+
+
+def make_source(term_count: int) -> str:
+    return " ".join([SOURCE_BLOCK] * max(1, term_count // SOURCE_BLOCK_TERMS))
+
+
+def measure(function, *args, trace_memory: bool = False) -> tuple[any, float]:
+    """Один вызов `function`: результат и время в секундах либо, с `trace_memory`, пик памяти в байтах.
+
+    Под `tracemalloc` вызов идёт в разы медленнее, поэтому время и память измеряются в разных запусках.
+    """
+    if trace_memory:
+        tracemalloc.start()
+        result = function(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, peak
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_translator(term_count: str = "1000000", metric: str = "time") -> dict:
+    assert metric in ("time", "memory"), f"Неизвестная метрика: {metric}"
+    trace_memory = metric == "memory"
+    source = make_source(int(term_count))
+    translator.reset()
+    terms, split = measure(translator.split_to_terms, source, trace_memory=trace_memory)
+    translator.validate_and_correct_terms(terms)
+    code, codegen = measure(translator.terms_to_opcodes, terms, trace_memory=trace_memory)
+    if trace_memory:
+        return {
+            "terms": len(terms),
+            "instr": len(code),
+            "split_peak_mib": split / 2**20,
+            "codegen_peak_mib": codegen / 2**20,
+        }
+    return {"terms": len(terms), "instr": len(code), "split_s": split, "codegen_s": codegen}
+
+
+def read_tokens(token_path: str | None) -> list[tuple]:
+    if not token_path:
+        return []
+    with open(token_path, encoding="utf-8") as file:
+        return eval(file.read())
+
+
+def bench_inline(source_path: str, token_path: str | None = None) -> dict:
+    """Размер кода и такты без подстановки слов и устранения хвостовых вызовов и с ними."""
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    input_tokens = read_tokens(token_path)
+    result = {}
+    for name, options in (
+        ("plain", {"inline_size": 0, "loop_inline_size": 0, "tail_calls": False}),
+        ("optimized", {}),
+    ):
+        translator.reset()
+        code = translator.translate(source, **options)
+        _, instr_num, ticks = machine.simulation(code, limit=55000, input_tokens=list(input_tokens))
+        result[f"{name}_code"] = len(code)
+        result[f"{name}_instr"] = instr_num
+        result[f"{name}_ticks"] = ticks
+    result.update({key: value for key, value in translator.call_report.items() if not key.startswith("code_")})
+    result["code_delta"] = result["optimized_code"] - result["plain_code"]
+    result["ticks_delta"] = result["optimized_ticks"] - result["plain_ticks"]
+    return result
+
+
+def run_stack_cache(code: list, input_tokens: list[tuple], stack_registers: int, latency: int) -> machine.ControlUnit:
+    data_path = machine.DataPath(10000, 10000, 10000, input_tokens, stack_registers)
+    control_unit = machine.ControlUnit(data_path, 10000, latency)
+    control_unit.fill_memory(code)
+    machine.execute(control_unit, 55000)
+    return control_unit
+
+
+def bench_stack_cache(source_path: str, token_path: str | None = None, depths="2,3,4,6,8", latency="1") -> dict:
+    """Такты и обращения к памяти стека данных при разном числе регистров стека.
+
+    `latency` -- такты ожидания на одно обращение к памяти стека данных.
+    """
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    input_tokens = read_tokens(token_path)
+    translator.reset()
+    code = translator.translate(source)
+    result = {}
+    outputs = set()
+    for depth in (int(depth) for depth in depths.split(",")):
+        control_unit = run_stack_cache(code, list(input_tokens), depth, int(latency))
+        data_path = control_unit.data_path
+        outputs.add(data_path.out_buffer)
+        result["instr"] = control_unit.instruction_number
+        result[f"d{depth}_ticks"] = control_unit.tick_number
+        result[f"d{depth}_stack_reads"] = data_path.stack_reads
+        result[f"d{depth}_stack_writes"] = data_path.stack_writes
+        result[f"d{depth}_register_hits"] = data_path.stack_hits
+    assert len(outputs) == 1, "Вывод программы зависит от числа регистров стека"
+    return result
+
+
+def bench_memo(source_path: str, token_path: str | None = None, cache_size="64") -> dict:
+    """Такты без кэша чистых слов и с ним: начисленные программе и действительно смоделированные."""
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    input_tokens = read_tokens(token_path)
+    translator.reset()
+    code = translator.translate(source)
+    plain_output, _, plain_ticks = machine.simulation(code, limit=55000, input_tokens=list(input_tokens))
+    word_cache = machine.WordCache(int(cache_size))
+    output, _, ticks = machine.simulation(code, limit=55000, input_tokens=list(input_tokens), word_cache=word_cache)
+    return {
+        "pure_words": len(translator.pure_words),
+        "same_output": output == plain_output,
+        "plain_ticks": plain_ticks,
+        "charged_ticks": ticks,
+        "simulated_ticks": word_cache.simulated_ticks(ticks),
+        "hits": word_cache.hits,
+        "misses": word_cache.misses,
+        "evictions": word_cache.evictions,
+    }
+
+
+def bench_fast_forward(source_path: str, token_path: str | None = None) -> dict:
+    """Время моделирования с пропуском активного ожидания и без него; счётчики должны совпасть."""
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    input_tokens = read_tokens(token_path)
+    translator.reset()
+    code = translator.translate(source)
+    start = time.perf_counter()
+    plain = machine.simulation(code, limit=55000, input_tokens=list(input_tokens))
+    plain_time = time.perf_counter() - start
+    fast_forward = machine.FastForward()
+    start = time.perf_counter()
+    result = machine.simulation(code, limit=55000, input_tokens=list(input_tokens), fast_forward=fast_forward)
+    return {
+        "same_result": result == plain,
+        "instructions": result[1],
+        "ticks": result[2],
+        "skips": fast_forward.skips,
+        "skipped_instr": fast_forward.skipped_instructions,
+        "skipped_ticks": fast_forward.skipped_ticks,
+        "plain_time_s": plain_time,
+        "fast_time_s": time.perf_counter() - start,
+    }
+
+
+def bench_profile(source_path: str, token_path: str | None = None) -> dict:
+    """Время хоста на инструкцию и на такт по командам и на вызов по частям модели, по убыванию общего времени."""
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    translator.reset()
+    code = translator.translate(source)
+    start = time.perf_counter()
+    machine.simulation(code, limit=55000, input_tokens=read_tokens(token_path))
+    plain_time = time.perf_counter() - start
+    host_profile = machine.HostProfile()
+    start = time.perf_counter()
+    _, instructions, ticks = machine.simulation(
+        code, limit=55000, input_tokens=read_tokens(token_path), host_profile=host_profile
+    )
+    result = {
+        "instructions": instructions,
+        "ticks": ticks,
+        "plain_ns_per_instr": plain_time * 1e9 / instructions,
+        "plain_ns_per_tick": plain_time * 1e9 / ticks,
+        "profiled_time_s": time.perf_counter() - start,
+    }
+    for row in host_profile.report():
+        per_tick = "-" if row["ns_per_tick"] is None else f"{row['ns_per_tick']:.0f}"
+        result[row["command"]] = (
+            f"{row['count']} instr, {row['ns_per_instr']:.0f} ns/instr, {per_tick} ns/tick, {row['share']:.1%}"
+        )
+    methods = sorted(host_profile.methods.items(), key=lambda item: -item[1][1])
+    for name, (calls, ns) in methods:
+        if calls:
+            result[name] = f"{calls} calls, {ns / calls:.0f} ns/call, {ns / 1e6:.1f} ms"
+    return result
+
+
+def run_io(source_path: str, input_tokens: list[tuple], input_fifo: machine.InputFifo | None) -> dict:
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    translator.reset()
+    code = translator.translate(source)
+    interrupt_stats = machine.InterruptStats()
+    output, _, ticks = machine.simulation(
+        code, limit=55000, input_tokens=input_tokens, interrupt_stats=interrupt_stats, input_fifo=input_fifo
+    )
+    received = len(interrupt_stats.events) if input_fifo is None else input_fifo.received
+    return {
+        "output": output,
+        "ticks": ticks,
+        "interrupts": len(interrupt_stats.events),
+        "in_chars_per_tick": received / ticks,
+        "out_chars_per_tick": len(output) / ticks,
+        # Такты с запрещёнными прерываниями (обработчик) на принятый символ
+        "handler_ticks_per_char": interrupt_stats.disabled_ticks / max(1, received),
+    }
+
+
+def bench_io(source_path: str, fifo_source_path: str, token_path: str, depth="16") -> dict:
+    """Пропускная способность ввода-вывода: прерывание на символ и `emit` против буфера ввода и `type`."""
+    input_tokens = read_tokens(token_path)
+    plain = run_io(source_path, list(input_tokens), None)
+    input_fifo = machine.InputFifo(int(depth))
+    fifo = run_io(fifo_source_path, list(input_tokens), input_fifo)
+    result = {"same_output": plain.pop("output") == fifo.pop("output"), "fifo_overflows": input_fifo.overflows}
+    result.update({f"plain_{key}": value for key, value in plain.items()})
+    result.update({f"fifo_{key}": value for key, value in fifo.items()})
+    return result
+
+
+def bench_threads(source_path: str, token_path: str | None = None, runs="16", workers="1,2,4,8") -> dict:
+    """Время пакета одинаковых прогонов в пуле потоков и ускорение относительно одного потока."""
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    translator.reset()
+    code = translator.translate(source)
+    batch = [{"code": code, "limit": 55000, "input_tokens": read_tokens(token_path)} for _ in range(int(runs))]
+    # На сборках без GIL (python3.13t и новее) потоки исполняются параллельно
+    result = {"gil_enabled": getattr(sys, "_is_gil_enabled", lambda: True)()}
+    outputs, base = set(), None
+    for count in (int(count) for count in workers.split(",")):
+        start = time.perf_counter()
+        outputs.update(output for output, _, _ in machine.simulate_batch(batch, count))
+        elapsed = time.perf_counter() - start
+        base = base or elapsed
+        result[f"w{count}_time_s"] = elapsed
+        result[f"w{count}_speedup"] = base / elapsed
+    assert len(outputs) == 1, "Вывод программы зависит от числа потоков"
+    return result
+
+
+def bench_peephole(source_path: str, token_path: str | None = None) -> dict:
+    """Размер кода и такты без замены последовательностей по базе правил superopt.py и с ней."""
+    with open(source_path, encoding="utf-8") as file:
+        source = file.read()
+    input_tokens = read_tokens(token_path)
+    result, outputs = {"rules": len(peephole.RULES)}, []
+    for name, enabled in (("plain", False), ("peephole", True)):
+        translator.reset()
+        code = translator.translate(source, peephole=enabled)
+        output, instr_num, ticks = machine.simulation(code, limit=55000, input_tokens=list(input_tokens))
+        outputs.append(output)
+        result[f"{name}_code"] = len(code)
+        result[f"{name}_instr"] = instr_num
+        result[f"{name}_ticks"] = ticks
+    result["rewrites"] = translator.call_report["peephole_rewrites"]
+    # С вводом вывод обработчика может сместиться: изменились такты прихода прерываний
+    result["same_output"] = outputs[0] == outputs[1]
+    return result
+
+
+BENCHMARKS = {
+    "translator": bench_translator,
+    "inline": bench_inline,
+    "stack_cache": bench_stack_cache,
+    "memo": bench_memo,
+    "fast_forward": bench_fast_forward,
+    "profile": bench_profile,
+    "io": bench_io,
+    "threads": bench_threads,
+    "peephole": bench_peephole,
+}
+
+
+def main(name: str, args: list[str]) -> None:
+    assert name in BENCHMARKS, "Неизвестный бенчмарк: " + name
+    machine.logger.setLevel(logging.WARNING)
+    for key, value in BENCHMARKS[name](*args).items():
+        print(f"{key:>18}: {value:.3f}" if isinstance(value, float) else f"{key:>18}: {value}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 2, "Неверные аргументы: benchmark.py <name> [args...]"
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+
+from isa import write_code
+
+SOCKET_PATH = os.environ.get("CSA_DAEMON_SOCKET", "/tmp/csa_lab_daemon.sock")
+
+
+def send_message(stream, message: dict) -> None:
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def receive_message(stream) -> dict:
+    line = stream.readline()
+    assert line, "Соединение закрыто без ответа"
+    return json.loads(line)
+
+
+def request(message: dict, socket_path: str = SOCKET_PATH) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rwb") as stream:
+            send_message(stream, message)
+            response = receive_message(stream)
+    assert "error" not in response, response.get("error")
+    return response
+
+
+def read_text(path: str | None) -> str:
+    if not path:
+        return ""
+    with open(path, encoding="utf-8") as file:
+        return file.read()
+
+
+def print_run(response: dict) -> None:
+    sys.stderr.write(response["log"])
+    print(f"Output: {response['output']}\nInstructions: {response['instructions']}\nTicks: {response['ticks'] - 1}")
+
+
+def main(command: str, args: list[str]) -> None:
+    if command == "translate":
+        source_file, target_file = args
+        source_code = read_text(source_file)
+        response = request({"op": "translate", "source": source_code})
+        write_code(target_file, response["code"])
+        print("source LoC:", len(source_code.split("\n")), "code instr:", len(response["code"]))
+    elif command == "run":
+        code_file, *token_path = args
+        code = json.loads(read_text(code_file))
+        print_run(request({"op": "run", "code": code, "input": read_text(*token_path or [None])}))
+    elif command == "exec":
+        source_file, *token_path = args
+        print_run(request({"op": "run", "source": read_text(source_file), "input": read_text(*token_path or [None])}))
+    else:
+        for key, value in request({"op": command}).items():
+            print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 2, (
+        "Неверные аргументы: client.py translate <input_file> <target_file> | run <code_file> [<input_file>] | "
+        "exec <source_file> [<input_file>] | stats | shutdown"
+    )
+    main(sys.argv[1], sys.argv[2:])
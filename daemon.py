@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import io
+import socketserver
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+import machine
+import translator
+from client import SOCKET_PATH, receive_message, send_message
+
+CACHE_SIZE = 64
+INSTRUCTION_LIMIT = 55000
+
+
+class ProgramCache:
+    """LRU-кэш образов программ по хэшу исходного кода.
+
+    >>> cache = ProgramCache(2)
+    >>> cache.put("a", [1])
+    >>> cache.put("b", [2])
+    >>> cache.get("a")
+    [1]
+    >>> cache.put("c", [3])
+    >>> cache.get("b") is None
+    True
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, capacity: int):
+        assert capacity > 0, "Размер кэша должен быть > 0"
+        self.capacity = capacity
+        self.images = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> list | None:
+        image = self.images.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.images.move_to_end(key)
+        return image
+
+    def put(self, key: str, image: list) -> None:
+        self.images[key] = image
+        self.images.move_to_end(key)
+        if len(self.images) > self.capacity:
+            self.images.popitem(last=False)
+
+
+def source_hash(source_code: str) -> str:
+    return hashlib.sha256(source_code.encode("utf-8")).hexdigest()
+
+
+class Daemon:
+    """Транслятор и модель процессора, загруженные один раз и обслуживающие задания."""
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache = ProgramCache(cache_size)
+        self.jobs = 0
+
+    def translate(self, source_code: str) -> list:
+        key = source_hash(source_code)
+        code = self.cache.get(key)
+        if code is None:
+            translator.reset()
+            code = translator.translate(source_code)
+            self.cache.put(key, code)
+        return code
+
+    def run(self, message: dict) -> dict:
+        code = message["code"] if "code" in message else self.translate(message["source"])
+        input_tokens = ast.literal_eval(message["input"]) if message.get("input") else []
+        trace = io.StringIO()
+        output, instr_num, ticks = machine.simulation(
+            code,
+            message.get("limit", INSTRUCTION_LIMIT),
+            input_tokens,
+            trace=lambda line: trace.write(line + "\n"),
+        )
+        return {"output": output, "instructions": instr_num, "ticks": ticks, "log": trace.getvalue()}
+
+    def stats(self) -> dict:
+        return {
+            "jobs": self.jobs,
+            "cached": len(self.cache.images),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+    def handle(self, message: dict) -> dict:
+        """Ответ на задание. Любая ошибка задания, в том числе ошибка исполнения программы, возвращается клиенту.
+
+        >>> daemon = Daemon()
+        >>> daemon.handle({"op": "run", "source": "1 0 / 11 emit"})["error"]
+        'ZeroDivisionError: integer division or modulo by zero'
+        >>> daemon.handle({"op": "run", "source": "72 11 emit"})["output"]
+        'H'
+        """
+        self.jobs += 1
+        try:
+            if message["op"] == "translate":
+                return {"code": self.translate(message["source"])}
+            if message["op"] == "run":
+                return self.run(message)
+            if message["op"] in ("stats", "shutdown"):
+                return self.stats()
+            return {"error": f"Неизвестная операция: {message['op']}"}
+        except AssertionError as error:
+            return {"error": str(error) or type(error).__name__}
+        except Exception as error:
+            return {"error": f"{type(error).__name__}: {error}"}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        message = receive_message(self.rfile)
+        send_message(self.wfile, self.server.simulator.handle(message))
+        if message.get("op") == "shutdown":
+            self.server.stopped = True
+
+
+def serve(socket_path: str = SOCKET_PATH, cache_size: int = CACHE_SIZE) -> None:
+    Path(socket_path).unlink(missing_ok=True)
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as server:
+        server.simulator = Daemon(cache_size)
+        server.stopped = False
+        print(f"Listening on {socket_path}")
+        while not server.stopped:
+            server.handle_request()
+    Path(socket_path).unlink()
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) <= 3, "Неверные аргументы: daemon.py [<socket_path> [<cache_size>]]"
+    serve(*sys.argv[1:2], *[int(size) for size in sys.argv[2:3]])
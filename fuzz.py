@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import logging
+import random
+import sys
+import typing
+from pathlib import Path
+
+import machine
+import translator
+from isa import OpcodeType, write_code
+from workload import DISTRIBUTIONS, generate_schedule, write_schedule
+
+INSTRUCTION_LIMIT = 20000
+MEMORY_FILL = 2048
+MAX_DEPTH = 3
+VARIABLES = ("v0", "v1", "v2")
+# Адреса переменных в памяти данных, как их размещает транслятор
+VARIABLE_ADDRESSES = (512, 513, 514)
+# Выражение на вершине стека превращается в печатаемую букву
+TO_LETTER = "26 mod 65 + 11 emit"
+FORTH_HANDLER = ":intr h 0 read 11 emit ei ;"
+
+Engine = typing.Callable[[list, int, list[tuple]], machine.ControlUnit]
+
+
+def reference_engine(code: list, limit: int, input_tokens: list[tuple]) -> machine.ControlUnit:
+    data_path = machine.DataPath(10000, 10000, 10000, input_tokens)
+    control_unit = machine.ControlUnit(data_path, 10000)
+    control_unit.fill_memory(code)
+    machine.execute(control_unit, limit)
+    return control_unit
+
+
+def stack_cache_engine(code: list, limit: int, input_tokens: list[tuple]) -> machine.ControlUnit:
+    """Эталон с 8 регистрами стека данных: результат и такты не должны зависеть от глубины."""
+    data_path = machine.DataPath(10000, 10000, 10000, input_tokens, stack_registers=8)
+    control_unit = machine.ControlUnit(data_path, 10000)
+    control_unit.fill_memory(code)
+    machine.execute(control_unit, limit)
+    data_path.flush_stack_cache()
+    return control_unit
+
+
+def fast_forward_engine(code: list, limit: int, input_tokens: list[tuple]) -> machine.ControlUnit:
+    """Эталон с пропуском активного ожидания: счётчики должны совпасть с полным исполнением."""
+    data_path = machine.DataPath(10000, 10000, 10000, input_tokens)
+    control_unit = machine.ControlUnit(data_path, 10000)
+    control_unit.fill_memory(code)
+    control_unit.fast_forward = machine.FastForward()
+    machine.execute(control_unit, limit)
+    return control_unit
+
+
+# Движки, сравниваемые с эталонным. Эталон сравнивается и сам с собой: это ловит состояние,
+# протекающее между запусками
+ENGINES: dict[str, Engine] = {
+    "reference": reference_engine,
+    "stack_cache": stack_cache_engine,
+    "fast_forward": fast_forward_engine,
+}
+
+
+def register_engine(name: str, engine: Engine) -> None:
+    ENGINES[name] = engine
+
+
+def snapshot(control_unit: machine.ControlUnit) -> dict:
+    """Наблюдаемый результат запуска: вывод, счётчики и конечное состояние процессора."""
+    data_path = control_unit.data_path
+    return {
+        "output": data_path.out_buffer,
+        "instructions": control_unit.instruction_number,
+        "ticks": control_unit.tick_number,
+        "pc": data_path.pc,
+        "sp": data_path.sp,
+        "i": data_path.i,
+        "top": data_path.top_of_stack,
+        "next": data_path.next,
+        "loop": (data_path.loop_index, data_path.loop_limit, data_path.loop_depth),
+        "ps": dict(control_unit.ps),
+        # Ячейка sp логически принадлежит регистру next, живые ячейки стека данных -- ниже неё
+        "data_stack": data_path.data_stack[: data_path.sp],
+        "return_stack": data_path.return_stack[: data_path.i + 1],
+        "memory": {address: value for address, value in enumerate(data_path.memory) if value != MEMORY_FILL},
+        "tokens_handled": list(data_path.tokens_handled),
+        "interrupts": control_unit.interrupt_stats.events,
+    }
+
+
+def run_engine(engine: Engine, code: list, limit: int, input_tokens: list[tuple]) -> dict:
+    try:
+        return snapshot(engine(code, limit, list(input_tokens)))
+    except Exception as error:
+        # Падение модели -- тоже результат, он должен совпадать у всех движков
+        return {"error": f"{type(error).__name__}: {error}"}
+
+
+class ForthGenerator:
+    """Случайные операторы Forth с нулевым итоговым эффектом на стек данных."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.words = 0
+
+    def expression(self, depth: int, in_loop: bool) -> str:
+        """Выражение, кладущее на стек одно значение."""
+        rng = self.rng
+        if depth == 0 or rng.random() < 0.3:
+            leaves = [str(rng.randint(0, 99)), f"{rng.choice(VARIABLES)} @", *(["i"] if in_loop else [])]
+            return rng.choice(leaves)
+        first, second = self.expression(depth - 1, in_loop), self.expression(depth - 1, in_loop)
+        return rng.choice(
+            [
+                f"{first} {second} {rng.choice(['+', '-', '=', '<', 'or', '*', 'and', 'xor'])}",
+                f"{first} {rng.randint(1, 9)} {rng.choice(['/', 'mod'])}",
+                f"{first} {rng.randint(0, 4)} {rng.choice(['lshift', 'rshift'])}",
+                f"{first} negate",
+                f"{first} dup +",
+                f"{first} {second} swap -",
+                f"{first} {second} over - +",
+                f"{first} {second} drop",
+            ]
+        )
+
+    def statement(self, depth: int, in_loop: bool, top_level: bool) -> str:
+        rng = self.rng
+        kinds = ["letter", "number", "store", "string"]
+        if depth < MAX_DEPTH:
+            kinds += ["if", "do", "begin", "di"]
+        if top_level:
+            kinds += ["word", "wait"]
+        return getattr(self, f"make_{rng.choice(kinds)}")(depth, in_loop)
+
+    def make_letter(self, depth: int, in_loop: bool) -> str:
+        return f"{self.expression(2, in_loop)} {TO_LETTER}"
+
+    def make_number(self, depth: int, in_loop: bool) -> str:
+        return f"1024 {self.expression(2, in_loop)} ."
+
+    def make_store(self, depth: int, in_loop: bool) -> str:
+        return f"{self.expression(2, in_loop)} {self.rng.choice(VARIABLES)} !"
+
+    def make_string(self, depth: int, in_loop: bool) -> str:
+        return '11 ." ' + "".join(self.rng.choices("abcxyz ", k=self.rng.randint(1, 6))) + '"'
+
+    def make_if(self, depth: int, in_loop: bool) -> str:
+        then_branch = self.statement(depth + 1, in_loop, False)
+        if self.rng.random() < 0.5:
+            return f"{self.expression(1, in_loop)} if {then_branch} then"
+        return f"{self.expression(1, in_loop)} if {then_branch} else {self.statement(depth + 1, in_loop, False)} then"
+
+    def make_do(self, depth: int, in_loop: bool) -> str:
+        return f"{self.rng.randint(1, 4)} 0 do {self.statement(depth + 1, True, False)} loop"
+
+    def make_begin(self, depth: int, in_loop: bool) -> str:
+        # Счётчик c<depth> принадлежит только этому циклу, поэтому цикл всегда завершается
+        counter = f"c{depth}"
+        body = self.statement(depth + 1, in_loop, False)
+        return f"0 {counter} ! begin {body} {counter} @ 1 + dup {counter} ! {self.rng.randint(1, 3)} = until"
+
+    def make_wait(self, depth: int, in_loop: bool) -> str:
+        # Активное ожидание: обычно крутится до ограничения на число инструкций, прерывания приходят внутри
+        return f"begin {self.rng.choice(VARIABLES)} @ {self.rng.randint(0, 99)} = until"
+
+    def make_di(self, depth: int, in_loop: bool) -> str:
+        return f"di {self.statement(depth + 1, in_loop, False)} ei"
+
+    def make_word(self, depth: int, in_loop: bool) -> str:
+        name = f"w{self.words}"
+        self.words += 1
+        return f": {name} {self.statement(depth, False, False)} ; {name} {name}"
+
+
+class OpcodeGenerator:
+    """Случайные фрагменты машинного кода с нулевым итоговым эффектом на стек данных.
+
+    Инструкция фрагмента -- `(команда, аргумент, относительный ли аргумент)`. Относительный аргумент
+    отсчитывается от адреса самой инструкции, поэтому фрагменты можно вкладывать и склеивать без правок.
+    """
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def expression(self, depth: int, in_loop: bool) -> list[tuple]:
+        rng = self.rng
+        if depth == 0 or rng.random() < 0.3:
+            leaves = [[("push", rng.randint(0, 99))], [("push", rng.choice(VARIABLE_ADDRESSES)), ("load",)]]
+            return rng.choice([*leaves, *([[("index",)]] if in_loop else [])])
+        first, second = self.expression(depth - 1, in_loop), self.expression(depth - 1, in_loop)
+        return rng.choice(
+            [
+                [*first, *second, (rng.choice(["add", "sub", "eq", "ls", "or", "mul", "and", "xor"]),)],
+                [*first, ("push", rng.randint(1, 9)), (rng.choice(["div", "mod"]),)],
+                [*first, ("push", rng.randint(0, 4)), (rng.choice(["lshift", "rshift"]),)],
+                [*first, ("negate",)],
+                [*first, ("dup",), ("add",)],
+                [*first, *second, ("swap",), ("sub",)],
+                [*first, *second, ("over",), ("sub",), ("add",)],
+                [*first, *second, ("drop",)],
+            ]
+        )
+
+    def statement(self, depth: int, in_loop: bool) -> list[tuple]:
+        kinds = ["letter", "store"]
+        if depth < MAX_DEPTH:
+            kinds += ["if", "do", "return_stack", "di", "word"]
+        if depth == 0:
+            kinds += ["wait"]
+        return getattr(self, f"make_{self.rng.choice(kinds)}")(depth, in_loop)
+
+    def letter(self, body: list[tuple]) -> list[tuple]:
+        return [*body, ("push", 26), ("mod",), ("push", 65), ("add",), ("push", 11), ("emit",)]
+
+    def make_letter(self, depth: int, in_loop: bool) -> list[tuple]:
+        return self.letter(self.expression(2, in_loop))
+
+    def make_store(self, depth: int, in_loop: bool) -> list[tuple]:
+        return [*self.expression(2, in_loop), ("push", self.rng.choice(VARIABLE_ADDRESSES)), ("store",)]
+
+    def make_if(self, depth: int, in_loop: bool) -> list[tuple]:
+        body = self.statement(depth + 1, in_loop)
+        return [*self.expression(1, in_loop), ("zjmp", len(body) + 1, True), *body]
+
+    def make_do(self, depth: int, in_loop: bool) -> list[tuple]:
+        body = self.statement(depth + 1, True)
+        return [("push", self.rng.randint(1, 4)), ("push", 0), ("do",), *body, ("loop", -len(body), True)]
+
+    def make_return_stack(self, depth: int, in_loop: bool) -> list[tuple]:
+        body = self.statement(depth + 1, in_loop)
+        return self.letter([*self.expression(1, in_loop), ("pop",), *body, ("rpop",)])
+
+    def make_wait(self, depth: int, in_loop: bool) -> list[tuple]:
+        address, value = self.rng.choice(VARIABLE_ADDRESSES), self.rng.randint(0, 99)
+        return [("push", address), ("load",), ("push", value), ("eq",), ("zjmp", -4, True)]
+
+    def make_di(self, depth: int, in_loop: bool) -> list[tuple]:
+        return [("di",), *self.statement(depth + 1, in_loop), ("ei",)]
+
+    def make_word(self, depth: int, in_loop: bool) -> list[tuple]:
+        body = self.statement(depth + 1, False)
+        size = len(body)
+        return [("jmp", size + 2, True), *body, ("ret",), ("call", -size - 1, True), ("call", -size - 2, True)]
+
+
+def opcode_handler() -> list[tuple]:
+    return [("push", 0), ("read",), ("push", 11), ("emit",), ("ei",), ("ret",)]
+
+
+def assemble(fragments: list[list[tuple]], input_tokens: list[tuple]) -> list[dict]:
+    """Склеивает фрагменты в программу: переход на начало, обработчик прерывания по адресу 1, `halt`."""
+    handler = opcode_handler() if input_tokens else []
+    body = [instruction for fragment in fragments for instruction in fragment]
+    program = [("jmp", len(handler) + 1), *handler, *body]
+    code = []
+    for address, (command, *arg) in enumerate(program):
+        cell = {"index": address, "command": OpcodeType(command)}
+        if arg:
+            cell["arg"] = arg[0] + address if arg[1:] else arg[0]
+        code.append(cell)
+    code.append({"index": len(code), "command": OpcodeType.HALT})
+    return code
+
+
+def forth_source(fragments: list[str], input_tokens: list[tuple]) -> str:
+    variables = " ".join(f"variable {name}" for name in (*VARIABLES, *(f"c{depth}" for depth in range(MAX_DEPTH))))
+    return "\n".join([*([FORTH_HANDLER] if input_tokens else []), variables, *fragments])
+
+
+def build_code(case: dict) -> list:
+    if case["kind"] == "opcodes":
+        return assemble(case["fragments"], case["input"])
+    translator.reset()
+    return translator.translate(forth_source(case["fragments"], case["input"]))
+
+
+def random_schedule(rng: random.Random) -> list[tuple]:
+    if rng.random() < 0.3:
+        return []
+    return generate_schedule(
+        rng.choice(DISTRIBUTIONS), rng.randint(1, 8), rng.randrange(1 << 16), rng.randint(5, 80), 4, rng.randint(1, 300)
+    )
+
+
+def generate_case(kind: str, rng: random.Random, size: int = 8) -> dict:
+    if kind == "forth":
+        generator = ForthGenerator(rng)
+        fragments = [generator.statement(0, False, True) for _ in range(rng.randint(1, size))]
+    else:
+        generator = OpcodeGenerator(rng)
+        fragments = [generator.statement(0, False) for _ in range(rng.randint(1, size))]
+    return {"kind": kind, "fragments": fragments, "input": random_schedule(rng)}
+
+
+def compare(case: dict, engine: Engine, limit: int = INSTRUCTION_LIMIT) -> dict:
+    """Поля результата, в которых `engine` расходится с эталоном: `{поле: (эталон, engine)}`."""
+    code = build_code(case)
+    expected = run_engine(reference_engine, code, limit, case["input"])
+    actual = run_engine(engine, code, limit, case["input"])
+    return {
+        key: (expected.get(key), actual.get(key))
+        for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    }
+
+
+def shrink(case: dict, fails: typing.Callable[[dict], bool]) -> dict:
+    """Удаляет фрагменты программы и токены ввода, пока ошибка воспроизводится (упрощённый ddmin).
+
+    >>> case = {"kind": "forth", "fragments": ["1", "2", "3", "4", "5"], "input": [(1, "a"), (2, "b")]}
+    >>> shrink(case, lambda case: "4" in case["fragments"])
+    {'kind': 'forth', 'fragments': ['4'], 'input': []}
+    """
+    changed = True
+    while changed:
+        changed = False
+        for field in ("fragments", "input"):
+            chunk = max(1, len(case[field]) // 2)
+            while chunk >= 1:
+                start = 0
+                while start < len(case[field]):
+                    candidate = {**case, field: case[field][:start] + case[field][start + chunk :]}
+                    if fails(candidate):
+                        case, changed = candidate, True
+                    else:
+                        start += chunk
+                chunk //= 2
+    return case
+
+
+def write_reproducer(case: dict, target_dir: str, name: str) -> Path:
+    directory = Path(target_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    if case["kind"] == "forth":
+        program = directory / f"{name}.fth"
+        program.write_text(forth_source(case["fragments"], case["input"]), encoding="utf-8")
+    else:
+        program = directory / f"{name}.json"
+        write_code(str(program), build_code(case))
+    write_schedule(str(directory / f"{name}.input"), case["input"])
+    return program
+
+
+def fuzz(kind: str, iterations: int, seed: int = 0, target_dir: str = "fuzz_failures") -> int:
+    """Сравнивает все зарегистрированные движки с эталоном на `iterations` случайных программах.
+
+    >>> import tempfile
+    >>> target_dir = tempfile.mkdtemp()
+    >>> fuzz("opcodes", 5, 1, target_dir)
+    opcodes: 5 программ, движков 3, расхождений 0
+    0
+    >>> fuzz("forth", 5, 1, target_dir)
+    forth: 5 программ, движков 3, расхождений 0
+    0
+    """
+    rng = random.Random(seed)
+    failures = 0
+    for iteration in range(iterations):
+        case = generate_case(kind, rng)
+        for name, engine in ENGINES.items():
+            if not compare(case, engine):
+                continue
+            failures += 1
+            minimal = shrink(case, lambda candidate, engine=engine: bool(compare(candidate, engine)))
+            program = write_reproducer(minimal, target_dir, f"{kind}_{seed}_{iteration}_{name}")
+            print(f"[{iteration}] {name}: расхождение, воспроизведение в {program}")
+            for key, (expected, actual) in compare(minimal, engine).items():
+                print(f"    {key}: эталон {expected!r}, {name} {actual!r}")
+    print(f"{kind}: {iterations} программ, движков {len(ENGINES)}, расхождений {failures}")
+    return failures
+
+
+if __name__ == "__main__":
+    assert 3 <= len(sys.argv) <= 5, "Неверные аргументы: fuzz.py <forth|opcodes> <iterations> [<seed> [<target_dir>]]"
+    assert sys.argv[1] in ("forth", "opcodes"), f"Неизвестный вид программ: {sys.argv[1]}"
+    machine.logger.setLevel(logging.WARNING)
+    sys.exit(int(fuzz(sys.argv[1], int(sys.argv[2]), *[int(seed) for seed in sys.argv[3:4]], *sys.argv[4:5]) > 0))
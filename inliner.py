@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from isa import Opcode, OpcodeParam, OpcodeParamType, OpcodeType
+
+# Адрес, на который аппаратно передаётся управление при прерывании
+INTERRUPT_HANDLER_ADDRESS = 1
+BRANCH_OPCODES = (OpcodeType.JMP, OpcodeType.ZJMP, OpcodeType.LOOP)
+JUMP_OPCODES = (*BRANCH_OPCODES, OpcodeType.CALL)
+
+
+def find_words(code: list[Opcode]) -> dict[int, int]:
+    """Адрес начала каждого вызываемого слова -> адрес его `ret`."""
+    words = {}
+    for opcode in code:
+        if opcode.opcode_type is OpcodeType.CALL and opcode.params[0].value not in words:
+            entry = opcode.params[0].value
+            words[entry] = next(idx for idx in range(entry, len(code)) if code[idx].opcode_type is OpcodeType.RET)
+    return words
+
+
+def word_callees(code: list[Opcode], entry: int, ret: int) -> set[int]:
+    return {code[idx].params[0].value for idx in range(entry, ret) if code[idx].opcode_type is OpcodeType.CALL}
+
+
+def find_recursive_words(code: list[Opcode], words: dict[int, int]) -> set[int]:
+    recursive = set()
+    for entry, ret in words.items():
+        stack, seen = list(word_callees(code, entry, ret)), set()
+        while stack and entry not in seen:
+            callee = stack.pop()
+            if callee not in seen and callee in words:
+                seen.add(callee)
+                stack.extend(word_callees(code, callee, words[callee]))
+        if entry in seen:
+            recursive.add(entry)
+    return recursive
+
+
+def reads_caller_return_stack(code: list[Opcode], entry: int, ret: int) -> bool:
+    """Слово снимает со стека возврата больше, чем положило, или оставляет на нём значения,
+    и `ret` увидит не свой адрес."""
+    depth = 0
+    for idx in range(entry, ret):
+        if code[idx].opcode_type is OpcodeType.POP:
+            depth += 1
+        elif code[idx].opcode_type is OpcodeType.RPOP:
+            depth -= 1
+            if depth < 0:
+                return True
+    return depth != 0
+
+
+def find_frame_dependent_words(code: list[Opcode], words: dict[int, int]) -> set[int]:
+    """Слова, которые сами или через вызываемые слова видят адрес возврата на стеке возврата."""
+    dependent = {entry for entry, ret in words.items() if reads_caller_return_stack(code, entry, ret)}
+    changed = True
+    while changed:
+        changed = False
+        for entry, ret in words.items():
+            if entry not in dependent and word_callees(code, entry, ret) & dependent:
+                dependent.add(entry)
+                changed = True
+    return dependent
+
+
+def find_loops(code: list[Opcode]) -> list[tuple[int, int]]:
+    return [
+        (opcode.params[0].value, idx)
+        for idx, opcode in enumerate(code)
+        if opcode.opcode_type in BRANCH_OPCODES and opcode.params[0].value <= idx
+    ]
+
+
+def relocated(opcode: Opcode, target: int) -> Opcode:
+    return Opcode(opcode.opcode_type, [OpcodeParam(OpcodeParamType.CONST, target)])
+
+
+class Inliner:
+    """Подставляет тела слов на место `call`.
+
+    Подставляются слова не длиннее `inline_size` инструкций, а внутри циклов -- не длиннее
+    `loop_inline_size`. Рекурсивные слова, обработчик прерывания и слова, обращающиеся к стеку
+    возврата вызывающего, не подставляются.
+    """
+
+    def __init__(self, code: list[Opcode], inline_size: int, loop_inline_size: int, keep: set[int] = frozenset()):
+        self.code = code
+        self.inline_size = inline_size
+        self.loop_inline_size = loop_inline_size
+        self.words = find_words(code)
+        excluded = find_recursive_words(code, self.words) | find_frame_dependent_words(code, self.words) | keep
+        self.inlinable = {entry for entry in self.words if entry not in excluded and entry != INTERRUPT_HANDLER_ADDRESS}
+        self.loops = find_loops(code)
+        self.result = []
+        self.address_map = {}
+        self.fixups = []
+        self.inlined_calls = 0
+
+    def in_loop(self, address: int) -> bool:
+        return any(start <= address < end for start, end in self.loops)
+
+    def should_inline(self, address: int, in_loop: bool) -> bool:
+        opcode = self.code[address]
+        if opcode.opcode_type is not OpcodeType.CALL or opcode.params[0].value not in self.inlinable:
+            return False
+        entry = opcode.params[0].value
+        size = self.words[entry] - entry
+        return size <= self.inline_size or ((in_loop or self.in_loop(address)) and size <= self.loop_inline_size)
+
+    def emit_range(self, start: int, end: int, address_map: dict[int, int], in_loop: bool) -> None:
+        for address in range(start, end):
+            address_map[address] = len(self.result)
+            opcode = self.code[address]
+            if opcode.opcode_type not in JUMP_OPCODES:
+                self.result.append(opcode)
+            elif self.should_inline(address, in_loop):
+                self.inline(opcode.params[0].value, in_loop or self.in_loop(address))
+            else:
+                # Переходы внутри подставленного тела ведут в его копию, вызовы -- в исходные слова
+                target_map = self.address_map if opcode.opcode_type is OpcodeType.CALL else address_map
+                copy = relocated(opcode, opcode.params[0].value)
+                self.fixups.append((copy.params[0], target_map))
+                self.result.append(copy)
+
+    def inline(self, entry: int, in_loop: bool) -> None:
+        ret = self.words[entry]
+        local_map = {}
+        self.emit_range(entry, ret, local_map, in_loop)
+        local_map[ret] = len(self.result)
+        self.inlined_calls += 1
+
+    def run(self) -> list[Opcode]:
+        self.emit_range(0, len(self.code), self.address_map, False)
+        self.address_map[len(self.code)] = len(self.result)
+        for param, target_map in self.fixups:
+            param.value = target_map[param.value]
+        return self.result
+
+    def definitions(self) -> list[tuple[int, int]]:
+        """Определения подставленных слов (`jmp` в обход тела .. `ret`) в новых адресах."""
+        return [
+            (self.address_map[entry - 1], self.address_map[ret])
+            for entry, ret in self.words.items()
+            if entry in self.inlinable
+            and self.code[entry - 1].opcode_type is OpcodeType.JMP
+            and self.code[entry - 1].params[0].value == ret + 1
+        ]
+
+
+def remove_ranges(code: list[Opcode], ranges: list[tuple[int, int]]) -> tuple[list[Opcode], list[int]]:
+    removed = set()
+    for start, end in ranges:
+        removed.update(range(start, end + 1))
+    result = []
+    address_map = []
+    for address, opcode in enumerate(code):
+        address_map.append(len(result))
+        if address not in removed:
+            result.append(opcode)
+    address_map.append(len(result))
+    for address, opcode in enumerate(result):
+        if opcode.opcode_type in JUMP_OPCODES:
+            result[address] = relocated(opcode, address_map[opcode.params[0].value])
+    return result, address_map
+
+
+def remove_dead_words(code: list[Opcode], definitions: list[tuple[int, int]]) -> tuple[list[Opcode], int]:
+    removed_words = 0
+    while True:
+        called = {opcode.params[0].value for opcode in code if opcode.opcode_type is OpcodeType.CALL}
+        dead = [(start, end) for start, end in definitions if start + 1 not in called]
+        if not dead:
+            return code, removed_words
+        definitions = [definition for definition in definitions if definition not in dead]
+        code, address_map = remove_ranges(code, dead)
+        definitions = [(address_map[start], address_map[end]) for start, end in definitions]
+        removed_words += len(dead)
+
+
+def eliminate_tail_calls(code: list[Opcode]) -> tuple[list[Opcode], int]:
+    """`call addr; ret` -> `jmp addr; ret`: вызванное слово вернётся сразу к вызывающему."""
+    words = find_words(code)
+    dependent = find_frame_dependent_words(code, words)
+    tail_calls = 0
+    for address, opcode in enumerate(code[:-1]):
+        if (
+            opcode.opcode_type is OpcodeType.CALL
+            and code[address + 1].opcode_type is OpcodeType.RET
+            and opcode.params[0].value not in dependent
+        ):
+            code[address] = Opcode(OpcodeType.JMP, opcode.params)
+            tail_calls += 1
+    return code, tail_calls
+
+
+def optimize_calls(
+    code: list[Opcode], inline_size: int, loop_inline_size: int, tail_calls: bool, keep: set[int] = frozenset()
+) -> tuple[list[Opcode], dict]:
+    """Подстановка слов и устранение хвостовых вызовов.
+
+    Возвращает новый код и отчёт: размер кода до и после, число подстановок, удалённых слов и
+    хвостовых вызовов. Каждая подстановка экономит 4 такта (`call` + `ret`) на исполнение,
+    каждый хвостовой вызов -- 3 такта (`call` -> `jmp` и пропущенный `ret`). Слова из `keep` не подставляются.
+    """
+    report = {"code_before": len(code), "inlined_calls": 0, "removed_words": 0, "tail_calls": 0}
+    if inline_size > 0 or loop_inline_size > 0:
+        inliner = Inliner(code, inline_size, loop_inline_size, keep)
+        code = inliner.run()
+        code, report["removed_words"] = remove_dead_words(code, inliner.definitions())
+        report["inlined_calls"] = inliner.inlined_calls
+    if tail_calls:
+        code, report["tail_calls"] = eliminate_tail_calls(code)
+    report["code_after"] = len(code)
+    return code, report
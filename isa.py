@@ -9,9 +9,13 @@ class OpcodeParamType(str, Enum):
     ADDR = "addr"
     UNDEFINED = "undefined"
     ADDR_REL = "addr_rel"
+    # Имя подпрограммы библиотеки времени исполнения, адрес известен после компоновки
+    RUNTIME = "runtime"
 
 
 class OpcodeParam:
+    __slots__ = ("param_type", "value")
+
     def __init__(self, param_type: OpcodeParamType, value: any):
         self.param_type = param_type
         self.value = value
@@ -32,10 +36,18 @@ class OpcodeType(str, Enum):
     EQ = "eq"
     LS = "ls"
     OR = "or"
+    MUL = "mul"
+    AND = "and"
+    XOR = "xor"
+    LSHIFT = "lshift"
+    RSHIFT = "rshift"
+    NEGATE = "negate"
     DI = "di"
     EI = "ei"
     EMIT = "emit"
     READ = "read"
+    TYPE = "type"
+    FIFO = "fifo"
     STORE = "store"
     LOAD = "load"
     PUSH = "push"
@@ -45,6 +57,11 @@ class OpcodeType(str, Enum):
     ZJMP = "zjmp"
     CALL = "call"
     RET = "ret"
+    DO = "do"
+    LOOP = "loop"
+    INDEX = "index"
+    SEND = "send"
+    CORE_ID = "coreid"
     HALT = "halt"
 
     def __str__(self):
@@ -52,6 +69,8 @@ class OpcodeType(str, Enum):
 
 
 class Opcode:
+    __slots__ = ("opcode_type", "params")
+
     def __init__(self, opcode_type: OpcodeType, params: list[OpcodeParam]):
         self.opcode_type = opcode_type
         self.params = params
@@ -92,8 +111,18 @@ class TermType(Enum):
         LOOP_CNT,
         CALL,
         STRING,
+        SEND,
+        CORE_ID,
         ENTRYPOINT,
-    ) = range(34)
+        MUL,
+        AND,
+        XOR,
+        LSHIFT,
+        RSHIFT,
+        NEGATE,
+        TYPE,
+        FIFO,
+    ) = range(44)
 
 
 def write_code(filename: str, code: list[dict]):
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import csv
 import logging
 import sys
+import time
 import typing
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
-import pytest as pytest
 from isa import OpcodeType, read_code
 
 logger = logging.getLogger("machine_logger")
@@ -24,6 +27,8 @@ class MUX(str, Enum):
     I_DEC = "i_dec"
     RET_STACK_PC = "ret_stack_pc"
     RET_STACK_OUT = "ret_stack_out"
+    RET_STACK_INDEX = "ret_stack_index"
+    RET_STACK_LIMIT = "ret_stack_limit"
     NEXT_MEM = "next_mem"
     NEXT_TOP = "next_top"
     NEXT_MEDIUM = "next_medium"
@@ -36,6 +41,14 @@ class MUX(str, Enum):
     TOP_MEM = "top_mem"
     TOP_IMMEDIATE = "top_immediate"
     TOP_INPUT = "top_input"
+    TOP_INDEX = "top_index"
+    INDEX_TOP = "index_top"
+    INDEX_INC = "index_inc"
+    INDEX_RETURN = "index_return"
+    LIMIT_NEXT = "limit_next"
+    LIMIT_RETURN = "limit_return"
+    LOOP_DEPTH_INC = "loop_depth_inc"
+    LOOP_DEPTH_DEC = "loop_depth_dec"
     PC_INC = "pc_int"
     PC_RET = "pc_ret"
     PC_IMMEDIATE = "pc_immediate"
@@ -52,13 +65,19 @@ class ALUOpcode(str, Enum):
     EQ = "eq"
     LS = "ls"
     OR = "or"
+    MUL = "mul"
+    AND = "and"
+    XOR = "xor"
+    LSHIFT = "lshift"
+    RSHIFT = "rshift"
+    NEGATE = "negate"
 
     def __str__(self) -> str:
         return str(self.value)
 
 
 class ALU:
-    alu_operations: typing.ClassVar[list[ALUOpcode]] = [
+    alu_operations: typing.ClassVar[tuple[ALUOpcode, ...]] = (
         ALUOpcode.ADD,
         ALUOpcode.SUB,
         ALUOpcode.DIV,
@@ -66,11 +85,15 @@ class ALU:
         ALUOpcode.EQ,
         ALUOpcode.LS,
         ALUOpcode.OR,
-    ]
-    result = None
-    src_a = None
-    src_b = None
-    operation = None
+        ALUOpcode.MUL,
+        ALUOpcode.AND,
+        ALUOpcode.XOR,
+        ALUOpcode.LSHIFT,
+        ALUOpcode.RSHIFT,
+        ALUOpcode.NEGATE,
+    )
+    # Операции с одним операндом: берут только вершину стека
+    unary_operations: typing.ClassVar[tuple[ALUOpcode, ...]] = (ALUOpcode.NEGATE,)
 
     def __init__(self):
         self.result = 0
@@ -79,6 +102,7 @@ class ALU:
         self.operation = None
 
     def alu_op(self) -> None:  # noqa: C901 -- function is too complex
+        assert self.operation in self.alu_operations, f"Неизвестная операция АЛУ: {self.operation}"
         if self.operation == ALUOpcode.ADD:
             self.result = self.src_a + self.src_b
         elif self.operation == ALUOpcode.DIV:
@@ -93,8 +117,17 @@ class ALU:
             self.result = int(self.src_a >= self.src_b)
         elif self.operation == ALUOpcode.OR:
             self.result = self.src_a | self.src_b
-        else:
-            pytest.fail(f"Unknown ALU operation: {self.operation}")
+        elif self.operation == ALUOpcode.MUL:
+            self.result = self.src_b * self.src_a
+        elif self.operation == ALUOpcode.AND:
+            self.result = self.src_a & self.src_b
+        elif self.operation == ALUOpcode.XOR:
+            self.result = self.src_a ^ self.src_b
+        elif self.operation in (ALUOpcode.LSHIFT, ALUOpcode.RSHIFT):
+            assert self.src_a >= 0, "Отрицательная величина сдвига"
+            self.result = self.src_b << self.src_a if self.operation == ALUOpcode.LSHIFT else self.src_b >> self.src_a
+        elif self.operation == ALUOpcode.NEGATE:
+            self.result = -self.src_a
 
     def set_details(self, src_a, src_b, operation: ALUOpcode) -> None:
         self.src_a = src_a
@@ -103,38 +136,36 @@ class ALU:
 
 
 class DataPath:
-    memory_size = None
-    memory = None
-    data_stack_size = None
-    data_stack = None
-    return_stack_size = None
-    return_stack = None
-
-    sp = None
-    i = None
-    pc = None
-    top_of_stack = None
-    next = None
-    medium = None
-
-    alu = None
-    input_tokens: typing.ClassVar[list[tuple]] = []
-    tokens_handled: typing.ClassVar[list[bool]] = []
-    out_buffer = ""
-
-    def __init__(self, memory_size: int, data_stack_size: int, return_stack_size: int, input_tokens: list[tuple]):
+    """Тракт данных. Всё состояние хранится в экземпляре, поэтому модели в разных потоках независимы."""
+
+    def __init__(
+        self,
+        memory_size: int,
+        data_stack_size: int,
+        return_stack_size: int,
+        input_tokens: list[tuple],
+        stack_registers: int = 2,
+    ):
         assert memory_size > 0, "Размер памяти данных должен быть > 0"
         assert data_stack_size > 0, "Размер стека данных должен быть > 0"
         assert return_stack_size > 0, "Размер стека возврата должен быть > 0"
+        assert stack_registers >= 2, "Вершина стека и next всегда хранятся в регистрах"
 
-        self.input_tokens = input_tokens
+        self.input_tokens = list(input_tokens)
         self.tokens_handled = [False for _ in input_tokens]
+        self.out_buffer = ""
         self.memory_size = memory_size
         self.memory = [2048] * memory_size
         self.data_stack_size = data_stack_size
         self.data_stack = [1024] * data_stack_size
         self.return_stack_size = return_stack_size
         self.return_stack = [1024] * return_stack_size
+        # Регистры стека под next: адрес ячейки стека данных -> значение
+        self.stack_cache = {}
+        self.stack_cache_size = stack_registers - 2
+        self.stack_reads = 0
+        self.stack_writes = 0
+        self.stack_hits = 0
 
         self.sp = 4
         self.i = 4
@@ -142,12 +173,17 @@ class DataPath:
         self.top_of_stack = 1024
         self.next = 1024
         self.medium = 1024
+        self.loop_index = 0
+        self.loop_limit = 0
+        self.loop_depth = 0
 
         self.alu = ALU()
 
     def signal_latch_stack_pointer(self, mux: MUX) -> None:
         if mux is MUX.SP_DEC:
             self.sp -= 1
+            # Снятая со стека ячейка больше не читается, её регистр освобождается без записи в память
+            self.stack_cache.pop(self.sp + 1, None)
         elif mux is MUX.SP_INC:
             self.sp += 1
 
@@ -161,7 +197,7 @@ class DataPath:
         if mux is MUX.NEXT_MEM:
             assert self.sp >= 0, "Адрес меньше 0"
             assert self.sp < self.data_stack_size, "Переполнение стека данных"
-            self.next = self.data_stack[self.sp]
+            self.next = self.read_stack(self.sp)
         elif mux is MUX.NEXT_TOP:
             self.next = self.top_of_stack
         elif mux is MUX.NEXT_MEDIUM:
@@ -188,11 +224,77 @@ class DataPath:
             self.top_of_stack = self.memory[self.top_of_stack]
         elif mux is MUX.TOP_IMMEDIATE:
             self.top_of_stack = immediate
+        elif mux is MUX.TOP_INDEX:
+            self.top_of_stack = self.loop_index
+
+    def signal_latch_loop_index(self, mux: MUX) -> None:
+        if mux is MUX.INDEX_TOP:
+            self.loop_index = self.top_of_stack
+        elif mux is MUX.INDEX_INC:
+            self.loop_index += 1
+        elif mux is MUX.INDEX_RETURN:
+            assert self.i >= 0, "Адрес меньше 0"
+            self.loop_index = self.return_stack[self.i]
+
+    def signal_latch_loop_limit(self, mux: MUX) -> None:
+        if mux is MUX.LIMIT_NEXT:
+            self.loop_limit = self.next
+        elif mux is MUX.LIMIT_RETURN:
+            assert self.i >= 0, "Адрес меньше 0"
+            self.loop_limit = self.return_stack[self.i]
+
+    def signal_latch_loop_depth(self, mux: MUX) -> None:
+        if mux is MUX.LOOP_DEPTH_INC:
+            self.loop_depth += 1
+        elif mux is MUX.LOOP_DEPTH_DEC:
+            self.loop_depth -= 1
+
+    def read_stack(self, address: int) -> int:
+        if address in self.stack_cache:
+            self.stack_hits += 1
+            return self.stack_cache[address]
+        self.stack_reads += 1
+        return self.data_stack[address]
 
     def signal_data_wr(self) -> None:
         assert self.sp >= 0, "Адрес меньше 0"
         assert self.sp < self.data_stack_size, "Переполнение стека данных"
-        self.data_stack[self.sp] = self.next
+        if self.stack_cache_size == 0:
+            self.stack_writes += 1
+            self.data_stack[self.sp] = self.next
+            return
+        self.stack_hits += 1
+        self.stack_cache[self.sp] = self.next
+        if len(self.stack_cache) > self.stack_cache_size:
+            # Вытесняется самая глубокая ячейка
+            spilled = min(self.stack_cache)
+            self.stack_writes += 1
+            self.data_stack[spilled] = self.stack_cache.pop(spilled)
+
+    def stack_cell(self, address: int) -> int:
+        return self.stack_cache.get(address, self.data_stack[address])
+
+    def peek_stack(self, count: int) -> list[int]:
+        """Верхние `count` значений стека данных, начиная с вершины."""
+        values = [self.top_of_stack, self.next, *(self.stack_cell(self.sp - depth) for depth in range(1, count - 1))]
+        return values[:count]
+
+    def replace_stack(self, count: int, values: list[int]) -> None:
+        """Снимает со стека `count` значений и кладёт `values` сигналами `drop` и `push`, без тактов."""
+        for _ in range(count):
+            self.signal_latch_top(MUX.TOP_NEXT)
+            self.signal_latch_stack_pointer(MUX.SP_DEC)
+            self.signal_latch_next(MUX.NEXT_MEM)
+        for value in values:
+            self.signal_data_wr()
+            self.signal_latch_stack_pointer(MUX.SP_INC)
+            self.signal_latch_next(MUX.NEXT_TOP)
+            self.signal_latch_top(MUX.TOP_IMMEDIATE, value)
+
+    def flush_stack_cache(self) -> None:
+        """Записывает регистры стека в память, чтобы `data_stack` отражал логическое состояние."""
+        for address, value in self.stack_cache.items():
+            self.data_stack[address] = value
 
     def signal_ret_wr(self, mux: MUX) -> None:
         assert self.i >= 0, "Address below 0"
@@ -201,12 +303,20 @@ class DataPath:
             self.return_stack[self.i] = self.pc
         elif mux is MUX.RET_STACK_OUT:
             self.return_stack[self.i] = self.medium
+        elif mux is MUX.RET_STACK_INDEX:
+            self.return_stack[self.i] = self.loop_index
+        elif mux is MUX.RET_STACK_LIMIT:
+            self.return_stack[self.i] = self.loop_limit
 
     def signal_mem_write(self) -> None:
         assert self.top_of_stack >= 0, "Адрес меньше 0"
         assert self.top_of_stack < self.memory_size, "Переполнение памяти"
         self.memory[self.top_of_stack] = self.next
 
+    def signal_block_out(self, address: int) -> None:
+        assert 0 <= address < self.memory_size, "Блок вывода выходит за память данных"
+        self.out_buffer += chr(self.memory[address])
+
     def signal_alu_operation(self, operation: ALUOpcode) -> None:
         self.alu.set_details(self.top_of_stack, self.next, operation)
         self.alu.alu_op()
@@ -221,24 +331,482 @@ def opcode_to_alu_opcode(opcode_type: OpcodeType):
         OpcodeType.EQ: ALUOpcode.EQ,
         OpcodeType.LS: ALUOpcode.LS,
         OpcodeType.OR: ALUOpcode.OR,
+        OpcodeType.MUL: ALUOpcode.MUL,
+        OpcodeType.AND: ALUOpcode.AND,
+        OpcodeType.XOR: ALUOpcode.XOR,
+        OpcodeType.LSHIFT: ALUOpcode.LSHIFT,
+        OpcodeType.RSHIFT: ALUOpcode.RSHIFT,
+        OpcodeType.NEGATE: ALUOpcode.NEGATE,
     }.get(opcode_type)
 
 
-class ControlUnit:
-    program_memory_size = None
-    program_memory = None
-    data_path = None
-    ps = None
-    IO = ""
+def percentile(values: list[int], percent: int) -> int | None:
+    """Перцентиль методом ближайшего ранга.
+
+    >>> percentile([5, 1, 4, 2, 3], 50)
+    3
+    >>> percentile([5, 1, 4, 2, 3], 90)
+    5
+    >>> percentile([], 50) is None
+    True
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-percent * len(ordered) // 100))
+    return ordered[rank - 1]
+
+
+class InterruptStats:
+    """Задержка и время обслуживания прерываний ввода.
+
+    Для каждого доставленного токена запоминается такт, на который он был запланирован, такт входа в
+    обработчик и такт `ei`, разрешающей прерывания снова. Также считается общее время с запрещёнными
+    прерываниями и токены, не обслуженные к остановке.
+    """
+
+    csv_fields = ("token", "char", "scheduled_tick", "entry_tick", "latency", "ei_tick", "service")
+
+    def __init__(self):
+        self.events = []
+        self.disabled_since = None
+        self.disabled_ticks = 0
+        self.pending = 0
+        self.not_arrived = 0
+
+    def on_disable(self, tick_number: int) -> None:
+        if self.disabled_since is None:
+            self.disabled_since = tick_number
+
+    def close_disabled(self, tick_number: int) -> None:
+        if self.disabled_since is not None:
+            self.disabled_ticks += tick_number - self.disabled_since
+            self.disabled_since = None
+
+    def on_enable(self, tick_number: int) -> None:
+        self.close_disabled(tick_number)
+        if self.events and self.events[-1]["ei_tick"] is None:
+            event = self.events[-1]
+            event["ei_tick"] = tick_number
+            event["service"] = tick_number - event["entry_tick"]
+
+    def on_entry(self, token_index: int, token: tuple, tick_number: int) -> None:
+        self.events.append(
+            {
+                "token": token_index,
+                "char": token[1],
+                "scheduled_tick": token[0],
+                "entry_tick": tick_number,
+                "latency": tick_number - token[0],
+                "ei_tick": None,
+                "service": None,
+            }
+        )
+
+    def finish(self, tick_number: int, input_tokens: list[tuple], tokens_handled: list[bool]) -> None:
+        """Итоги на такт остановки. Обработчик, не дошедший до `ei`, остаётся без `ei_tick` и `service`.
+
+        >>> stats = InterruptStats()
+        >>> stats.on_disable(10)
+        >>> stats.on_entry(0, (8, "a"), 10)
+        >>> stats.finish(30, [(8, "a"), (25, "b"), (40, "c")], [True, False, False])
+        >>> stats.events[0]["ei_tick"], stats.disabled_ticks, stats.pending, stats.not_arrived
+        (None, 20, 1, 1)
+        """
+        self.close_disabled(tick_number)
+        for token, handled in zip(input_tokens, tokens_handled):
+            if not handled:
+                if token[0] <= tick_number:
+                    self.pending += 1
+                else:
+                    self.not_arrived += 1
+
+    def summary(self) -> dict:
+        result = {
+            "delivered": len(self.events),
+            "pending_at_halt": self.pending,
+            "not_arrived": self.not_arrived,
+            "disabled_ticks": self.disabled_ticks,
+        }
+        for field in ("latency", "service"):
+            values = [event[field] for event in self.events if event[field] is not None]
+            for percent in (50, 90, 99):
+                result[f"{field}_p{percent}"] = percentile(values, percent)
+            result[f"{field}_max"] = max(values, default=None)
+        return result
+
+    def write_csv(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=self.csv_fields)
+            writer.writeheader()
+            writer.writerows(self.events)
+
+
+class WordCache:
+    """Кэш результатов чистых слов -- режим моделирования, включаемый по выбору.
+
+    Транслятор помечает начало чистого слова ключом `"pure": [аргументов, результатов]`. Ключ кэша -- адрес
+    слова и значения аргументов на стеке. При попадании `call` не исполняется: аргументы заменяются на стеке
+    результатами, а счётчики тактов и инструкций увеличиваются на длительность исходного вызова. Поэтому
+    `tick_number` остаётся архитектурным временем (по нему приходят прерывания), а `simulated_ticks`
+    показывает, сколько тактов модель действительно прошла. Прерывание, пришедшее во время пропущенного
+    вызова, обслуживается после него.
+
+    С задержкой памяти стека (`stack_memory_latency`) длительность вызова зависит от глубины стека и содержимого
+    регистров стека, поэтому в этом режиме кэш не используется.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(": sq dup * ; 3 sq 3 sq + 3 sq + 1024 swap .", inline_size=0, loop_inline_size=0)
+    >>> cache = WordCache(4)
+    >>> plain, cached = simulation(code, 1000, [], trace=None), simulation(code, 1000, [], word_cache=cache, trace=None)
+    >>> cached == plain, cache.hits, cache.misses
+    (True, 2, 1)
+    """
+
+    def __init__(self, capacity: int):
+        assert capacity > 0, "Размер кэша должен быть > 0"
+        self.capacity = capacity
+        self.results = OrderedDict()
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_ticks = 0
+        self.saved_instructions = 0
+
+    def call(self, control_unit: ControlUnit, entry: int) -> bool:
+        """Пытается заменить вызов `entry` результатом из кэша. Возвращает True при попадании."""
+        effect = control_unit.program_memory[entry].get("pure")
+        if effect is None or control_unit.stack_memory_latency:
+            return False
+        data_path = control_unit.data_path
+        inputs, outputs = effect
+        key = (entry, *data_path.peek_stack(inputs))
+        cached = self.results.get(key)
+        if cached is None:
+            self.misses += 1
+            self.discard_abandoned(data_path.i - 1)
+            self.pending.append(
+                (
+                    data_path.i,
+                    key,
+                    outputs,
+                    control_unit.tick_number,
+                    control_unit.instruction_number,
+                    len(control_unit.interrupt_stats.events),
+                )
+            )
+            return False
+        self.hits += 1
+        self.results.move_to_end(key)
+        values, ticks, instructions = cached
+        data_path.replace_stack(inputs, values)
+        control_unit.tick_number += ticks
+        control_unit.instruction_number += instructions
+        self.saved_ticks += ticks
+        self.saved_instructions += instructions
+        return True
+
+    def returned(self, control_unit: ControlUnit) -> None:
+        """Запоминает результат, если `ret` завершил вызов чистого слова, пропущенного мимо кэша."""
+        self.discard_abandoned(control_unit.data_path.i)
+        if not self.pending or self.pending[-1][0] != control_unit.data_path.i:
+            return
+        _, key, outputs, start_tick, start_instruction, interrupts = self.pending.pop()
+        if len(control_unit.interrupt_stats.events) != interrupts:
+            # Во время вызова работал обработчик прерывания, длительность вызова не только его собственная
+            return
+        values = control_unit.data_path.peek_stack(outputs)[::-1]
+        ticks = control_unit.tick_number - start_tick
+        self.results[key] = (values, ticks, control_unit.instruction_number - start_instruction)
+        if len(self.results) > self.capacity:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def discard_abandoned(self, depth: int) -> None:
+        """Забывает вызовы глубже `depth` на стеке возврата: их кадр снят без `ret` этого вызова."""
+        while self.pending and self.pending[-1][0] > depth:
+            self.pending.pop()
+
+    def simulated_ticks(self, tick_number: int) -> int:
+        return tick_number - self.saved_ticks
+
+
+class FastForward:
+    """Пропуск активного ожидания -- режим моделирования, включаемый по выбору.
+
+    Итерация цикла, не меняющая архитектурного состояния, повторяется без изменений до прихода прерывания.
+    Итерация -- участок между двумя переходами назад на один адрес, в котором исполнялись только команды из
+    `spin_commands` (без записи в память, ввода-вывода, стека возврата и регистров цикла) и не было входа в
+    обработчик. Если состояние процессора в конце итерации совпало с состоянием в её начале, модель сразу
+    прибавляет к счётчикам такты и инструкции всех итераций до такта ближайшего токена ввода (или до
+    ограничения на число инструкций). Счётчики совпадают с полным исполнением.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(
+    ...     ":intr h 10 read dup 10 = if 1 stop ! then 11 emit ei ; variable stop 0 stop ! begin stop @ until"
+    ... )
+    >>> tokens = [(33, "h"), (80, "i"), (390, "\\n")]
+    >>> fast_forward = FastForward()
+    >>> plain = simulation(code, 1000, tokens, trace=None)
+    >>> simulation(code, 1000, tokens, fast_forward=fast_forward, trace=None) == plain, plain[0]
+    (True, 'hi\\n')
+    >>> fast_forward.skips > 0, fast_forward.skipped_instructions > 0
+    (True, True)
+    """
+
+    # Мнемоники: в коде, прочитанном из JSON, команды -- строки
+    spin_commands = frozenset(
+        str(command)
+        for command in (
+            OpcodeType.PUSH,
+            OpcodeType.LOAD,
+            OpcodeType.DUP,
+            OpcodeType.DROP,
+            OpcodeType.SWAP,
+            OpcodeType.OVER,
+            OpcodeType.INDEX,
+            OpcodeType.CORE_ID,
+            OpcodeType.JMP,
+            OpcodeType.ZJMP,
+            *(command for command in OpcodeType if opcode_to_alu_opcode(command) is not None),
+        )
+    )
+
+    def __init__(self):
+        self.pc = 0
+        self.interrupts = 0
+        self.start = None
+        self.skips = 0
+        self.skipped_ticks = 0
+        self.skipped_instructions = 0
+
+    @staticmethod
+    def state(control_unit: ControlUnit) -> tuple:
+        data_path = control_unit.data_path
+        return (
+            data_path.pc,
+            data_path.sp,
+            data_path.top_of_stack,
+            data_path.next,
+            data_path.medium,
+            tuple(data_path.data_stack[: data_path.sp]),
+            tuple(sorted(data_path.stack_cache.items())),
+        )
+
+    @staticmethod
+    def counters(control_unit: ControlUnit) -> tuple[int, int, int, int, int]:
+        data_path = control_unit.data_path
+        return (
+            control_unit.tick_number,
+            control_unit.instruction_number,
+            data_path.stack_reads,
+            data_path.stack_writes,
+            data_path.stack_hits,
+        )
 
-    tick_number = 0
-    instruction_number = 0
+    def observe(self, control_unit: ControlUnit, limit: int) -> None:
+        """Вызывается после каждой команды. `self.pc` -- адрес только что исполненной команды."""
+        address, self.pc = self.pc, control_unit.data_path.pc
+        interrupts, self.interrupts = self.interrupts, len(control_unit.interrupt_stats.events)
+        command = str(control_unit.program_memory[address]["command"])
+        if interrupts != self.interrupts or command not in self.spin_commands:
+            self.start = None
+            return
+        if self.pc > address:
+            return
+        state, counters = self.state(control_unit), self.counters(control_unit)
+        if self.start is not None and self.start[0] == state:
+            self.skip(control_unit, limit, [now - before for now, before in zip(counters, self.start[1])])
+            counters = self.counters(control_unit)
+        self.start = (state, counters)
+
+    def next_token_tick(self, control_unit: ControlUnit) -> int | None:
+        # Буфер ввода принимает токены и при запрещённых прерываниях
+        if not control_unit.ps["Intr_On"] and control_unit.input_fifo is None:
+            return None
+        data_path = control_unit.data_path
+        return min(
+            (tick for (tick, _), handled in zip(data_path.input_tokens, data_path.tokens_handled) if not handled),
+            default=None,
+        )
+
+    def skip(self, control_unit: ControlUnit, limit: int, deltas: list[int]) -> None:
+        ticks, instructions = deltas[:2]
+        iterations = (limit - control_unit.instruction_number) // instructions
+        token_tick = self.next_token_tick(control_unit)
+        if token_tick is not None:
+            # Прерывание проверяется после каждой команды: все пропущенные итерации должны закончиться раньше
+            iterations = min(iterations, (token_tick - 1 - control_unit.tick_number) // ticks)
+        if iterations <= 0:
+            return
+        data_path = control_unit.data_path
+        control_unit.tick_number += iterations * ticks
+        control_unit.instruction_number += iterations * instructions
+        data_path.stack_reads += iterations * deltas[2]
+        data_path.stack_writes += iterations * deltas[3]
+        data_path.stack_hits += iterations * deltas[4]
+        self.skips += 1
+        self.skipped_ticks += iterations * ticks
+        self.skipped_instructions += iterations * instructions
+
+
+class InputFifo:
+    """Буфер ввода глубиной `depth` -- модель устройства ввода, включаемая по выбору.
+
+    Пришедшие токены попадают в буфер и при запрещённых прерываниях; токен, пришедший в полный буфер, теряется
+    (`overflows`). Прерывание запрашивается, пока буфер не пуст и прерывания разрешены, поэтому обработчик,
+    который разбирает буфер целиком (`fifo` -- число символов в буфере, `read` -- следующий символ), входит
+    один раз на пачку токенов.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(
+    ...     ":intr h begin 0 read 11 emit fifo 0 = until ei ; begin 0 until"
+    ... )
+    >>> fifo, interrupt_stats = InputFifo(4), InterruptStats()
+    >>> tokens = [(20, "a"), (21, "b"), (22, "c"), (300, "d")]
+    >>> simulation(code, 200, tokens, interrupt_stats=interrupt_stats, input_fifo=fifo)[0]
+    'abcd'
+    >>> len(interrupt_stats.events), fifo.received, fifo.overflows
+    (2, 4, 0)
+    """
+
+    def __init__(self, depth: int):
+        assert depth > 0, "Глубина буфера ввода должна быть > 0"
+        self.depth = depth
+        # (номер токена, токен)
+        self.buffer = deque()
+        self.received = 0
+        self.overflows = 0
+
+    def receive(self, control_unit: ControlUnit) -> None:
+        data_path = control_unit.data_path
+        for index, token in enumerate(data_path.input_tokens):
+            if not data_path.tokens_handled[index] and token[0] <= control_unit.tick_number:
+                data_path.tokens_handled[index] = True
+                if len(self.buffer) < self.depth:
+                    self.buffer.append((index, token))
+                    self.received += 1
+                else:
+                    self.overflows += 1
+
+    def poll(self, control_unit: ControlUnit) -> None:
+        self.receive(control_unit)
+        if control_unit.ps["Intr_On"] and self.buffer:
+            control_unit.enter_interrupt(*self.buffer[0])
+
+    def pop(self) -> str:
+        return self.buffer.popleft()[1][1] if self.buffer else "\0"
+
+
+class HostProfile:
+    """Время хоста на части модели -- режим профилирования, включаемый по выбору.
+
+    `attach` заменяет у экземпляров `ControlUnit` и `DataPath` обработку команды (`decode_execute`), методы
+    сигналов (`signal_*`), поиск прерываний, вывод трассы и проверку активного ожидания обёртками с
+    `time.perf_counter_ns`, поэтому без профиля модель ничего не платит. Время вложенных вызовов входит и во
+    время вызывающего: сигналы -- часть обработчика команды. Обёртка сама стоит десятки наносекунд, поэтому
+    числа годятся для сравнения частей модели и версий между собой, а не как абсолютная стоимость.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> profile = HostProfile()
+    >>> _, instructions, _ = simulation(translator.translate("2 3 + 11 emit"), 100, [], host_profile=profile)
+    >>> sorted(profile.commands), sum(count for count, _, _ in profile.commands.values()) == instructions
+    (['add', 'emit', 'halt', 'jmp', 'push'], True)
+    >>> profile.methods["signal_alu_operation"][0]
+    1
+    """
 
-    def __init__(self, data_path: DataPath, program_memory_size: int):
+    def __init__(self):
+        # Мнемоника -> [инструкций, тактов, нс]
+        self.commands = {}
+        # Имя метода -> [вызовов, нс]
+        self.methods = {}
+
+    def timed(self, name: str, method: typing.Callable) -> typing.Callable:
+        stats = self.methods.setdefault(name, [0, 0])
+
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter_ns() - start
+
+        return wrapper
+
+    def timed_decode(self, control_unit: ControlUnit) -> typing.Callable:
+        decode_execute = control_unit.decode_execute
+
+        def wrapper():
+            command = str(control_unit.program_memory[control_unit.data_path.pc]["command"])
+            tick_number = control_unit.tick_number
+            start = time.perf_counter_ns()
+            try:
+                decode_execute()
+            finally:
+                stats = self.commands.setdefault(command, [0, 0, 0])
+                stats[0] += 1
+                stats[1] += control_unit.tick_number - tick_number
+                stats[2] += time.perf_counter_ns() - start
+
+        return wrapper
+
+    def attach(self, control_unit: ControlUnit) -> None:
+        for unit in (control_unit, control_unit.data_path):
+            for name in dir(type(unit)):
+                if name.startswith("signal_"):
+                    setattr(unit, name, self.timed(name, getattr(unit, name)))
+        control_unit.find_interrupt = self.timed("find_interrupt", control_unit.find_interrupt)
+        control_unit.__print__ = self.timed("__print__", control_unit.__print__)
+        if control_unit.fast_forward is not None:
+            fast_forward = control_unit.fast_forward
+            fast_forward.observe = self.timed("fast_forward.observe", fast_forward.observe)
+        control_unit.decode_execute = self.timed_decode(control_unit)
+
+    def report(self) -> list[dict]:
+        """Команды по убыванию общего времени: нс на инструкцию и на такт."""
+        total = sum(ns for _, _, ns in self.commands.values()) or 1
+        rows = [
+            {
+                "command": command,
+                "count": count,
+                "ticks": ticks,
+                "ns_per_instr": ns / count,
+                "ns_per_tick": ns / ticks if ticks else None,
+                "share": ns / total,
+            }
+            for command, (count, ticks, ns) in self.commands.items()
+        ]
+        return sorted(rows, key=lambda row: -row["ns_per_instr"] * row["count"])
+
+
+class ControlUnit:
+    """Устройство управления. Всё состояние хранится в экземпляре, трасса пишется в `trace`
+    (по умолчанию -- общий `logger`, `None` отключает трассу)."""
+
+    def __init__(self, data_path: DataPath, program_memory_size: int, stack_memory_latency: int = 0):
+        assert stack_memory_latency >= 0, "Задержка памяти стека должна быть >= 0"
         self.data_path = data_path
+        self.stack_memory_latency = stack_memory_latency
         self.program_memory_size = program_memory_size
         self.program_memory = [{"index": x, "command": 0, "arg": 0} for x in range(self.program_memory_size)]
         self.ps = {"Intr_Req": False, "Intr_On": True}
+        self.IO = ""
+        self.tick_number = 0
+        self.instruction_number = 0
+        self.core_id = 0
+        self.message_port = None
+        self.interrupt_stats = InterruptStats()
+        self.word_cache = None
+        self.fast_forward = None
+        self.input_fifo = None
+        self.trace = logger.info
 
     def fill_memory(self, opcodes: list) -> None:
         for opcode in opcodes:
@@ -255,32 +823,65 @@ class ControlUnit:
             self.data_path.pc = immediate - 1
 
     def signal_latch_ps(self, intr_on: bool) -> None:
+        if intr_on and not self.ps["Intr_On"]:
+            self.interrupt_stats.on_enable(self.tick_number)
+        elif not intr_on and self.ps["Intr_On"]:
+            self.interrupt_stats.on_disable(self.tick_number)
         self.ps["Intr_On"] = intr_on
         self.ps["Intr_Req"] = self.find_interrupt()
 
+    def signal_port_write(self) -> None:
+        target, value = self.data_path.top_of_stack, self.data_path.next
+        if self.message_port is None:
+            assert target == self.core_id, f"Нет ядра #{target}"
+            self.deliver_message(self.tick_number, value)
+        else:
+            self.message_port(target, value, self.tick_number)
+
+    def deliver_message(self, tick_number: int, value: int) -> None:
+        # Сообщение от другого ядра приходит как токен ввода и вызывает прерывание
+        assert 0 <= value < 0x110000, f"Недопустимое значение сообщения: {value}"
+        self.data_path.input_tokens.append((tick_number, chr(value)))
+        self.data_path.tokens_handled.append(False)
+
+    def enter_interrupt(self, index: int, token: tuple) -> None:
+        self.ps["Intr_Req"] = True
+        self.ps["Intr_On"] = False
+        self.interrupt_stats.on_disable(self.tick_number)
+        self.tick([lambda: self.data_path.signal_ret_wr(MUX.RET_STACK_PC)])
+        self.tick(
+            [
+                lambda: self.signal_latch_pc(MUX.PC_IMMEDIATE, 1),
+                lambda: self.data_path.signal_latch_i(MUX.I_INC),
+            ]
+        )
+        self.interrupt_stats.on_entry(index, token, self.tick_number)
+
     def find_interrupt(self) -> bool:
-        if self.ps["Intr_On"]:
+        if self.input_fifo is not None:
+            self.input_fifo.poll(self)
+        elif self.ps["Intr_On"]:
             for index, interrupt in enumerate(self.data_path.input_tokens):
                 if not self.data_path.tokens_handled[index] and interrupt[0] <= self.tick_number:
                     self.IO = interrupt[1]
-                    self.ps["Intr_Req"] = True
-                    self.ps["Intr_On"] = False
                     self.data_path.tokens_handled[index] = True
-                    self.tick([lambda: self.data_path.signal_ret_wr(MUX.RET_STACK_PC)])
-                    self.tick(
-                        [
-                            lambda: self.signal_latch_pc(MUX.PC_IMMEDIATE, 1),
-                            lambda: self.data_path.signal_latch_i(MUX.I_INC),
-                        ]
-                    )
+                    self.enter_interrupt(index, interrupt)
                     break
         return False
 
     def tick(self, operations: list[typing.Callable], comment="", limit_tick=200) -> None:
         self.tick_number += 1
-        for operation in operations:
-            operation()
-        if self.tick_number < limit_tick:
+        if self.stack_memory_latency:
+            traffic = self.data_path.stack_reads + self.data_path.stack_writes
+            for operation in operations:
+                operation()
+            # Такты ожидания на каждое обращение к памяти стека данных, не обслуженное регистрами
+            traffic = self.data_path.stack_reads + self.data_path.stack_writes - traffic
+            self.tick_number += traffic * self.stack_memory_latency
+        else:
+            for operation in operations:
+                operation()
+        if self.tick_number < limit_tick and self.trace is not None:
             self.__print__(comment)
 
     def command_cycle(self):
@@ -292,6 +893,8 @@ class ControlUnit:
     def arithmetic(self, arithmetic_operation):
         self.tick([lambda: self.data_path.signal_alu_operation(arithmetic_operation)])
         self.tick([lambda: self.data_path.signal_latch_top(MUX.TOP_ALU)])
+        if arithmetic_operation in ALU.unary_operations:
+            return
         self.tick([lambda: self.data_path.signal_latch_stack_pointer(MUX.SP_DEC)])
         self.tick([lambda: self.data_path.signal_latch_next(MUX.NEXT_MEM)])
 
@@ -335,21 +938,24 @@ class ControlUnit:
         self.tick([lambda: self.data_path.signal_latch_next(MUX.NEXT_MEM)])
 
     def read(self):
-        self.tick(
-            [
-                lambda: self.data_path.signal_latch_top(MUX.TOP_NEXT),
-                lambda: self.data_path.signal_latch_stack_pointer(MUX.SP_DEC),
-            ]
-        )
-        self.tick([lambda: self.data_path.signal_data_wr()])
-        self.tick(
-            [
-                lambda: self.data_path.signal_latch_stack_pointer(MUX.SP_INC),
-                lambda: self.data_path.signal_latch_next(MUX.NEXT_TOP),
-            ]
-        )
+        # Обращение к устройству ввода занимает 4 такта: три такта ожидания, затем номер порта на вершине стека
+        # заменяется прочитанным символом, остальной стек не меняется
+        if self.input_fifo is not None:
+            self.IO = self.input_fifo.pop()
+        for _ in range(3):
+            self.tick([])
         self.tick([lambda: self.data_path.signal_latch_top(MUX.TOP_IMMEDIATE, ord(self.IO))])
 
+    def type(self):
+        # Стек: адрес блока, длина, порт. Блок выводится по символу за такт, затем три значения снимаются
+        self.drop()
+        count = self.data_path.top_of_stack
+        assert count >= 0, "Отрицательная длина блока вывода"
+        for offset in range(count):
+            self.tick([lambda offset=offset: self.data_path.signal_block_out(self.data_path.next + offset)])
+        self.drop()
+        self.drop()
+
     def swap(self):
         self.tick([lambda: self.data_path.signal_latch_medium(MUX.MEDIUM_TOP)])
         self.tick([lambda: self.data_path.signal_latch_top(MUX.TOP_NEXT)])
@@ -446,6 +1052,8 @@ class ControlUnit:
         self.tick([lambda: self.signal_latch_pc(MUX.PC_IMMEDIATE, memory_cell["arg"])])
 
     def call(self, memory_cell: dict):
+        if self.word_cache is not None and self.word_cache.call(self, memory_cell["arg"]):
+            return
         self.tick([lambda: self.data_path.signal_ret_wr(MUX.RET_STACK_PC)])
         self.tick(
             [
@@ -457,6 +1065,8 @@ class ControlUnit:
     def ret(self):
         self.tick([lambda: self.data_path.signal_latch_i(MUX.I_DEC)])
         self.tick([lambda: self.signal_latch_pc(MUX.PC_RET)])
+        if self.word_cache is not None:
+            self.word_cache.returned(self)
 
     def di(self):
         self.tick([lambda: self.signal_latch_ps(False)])
@@ -464,6 +1074,64 @@ class ControlUnit:
     def ei(self):
         self.tick([lambda: self.signal_latch_ps(True)])
 
+    def do(self):
+        if self.data_path.loop_depth > 0:
+            # Вложенный цикл: регистры внешнего цикла сохраняются на стек возврата
+            self.tick(
+                [
+                    lambda: self.data_path.signal_ret_wr(MUX.RET_STACK_LIMIT),
+                    lambda: self.data_path.signal_latch_i(MUX.I_INC),
+                ]
+            )
+            self.tick(
+                [
+                    lambda: self.data_path.signal_ret_wr(MUX.RET_STACK_INDEX),
+                    lambda: self.data_path.signal_latch_i(MUX.I_INC),
+                ]
+            )
+        self.tick(
+            [
+                lambda: self.data_path.signal_latch_loop_index(MUX.INDEX_TOP),
+                lambda: self.data_path.signal_latch_loop_limit(MUX.LIMIT_NEXT),
+                lambda: self.data_path.signal_latch_loop_depth(MUX.LOOP_DEPTH_INC),
+                lambda: self.data_path.signal_latch_stack_pointer(MUX.SP_DEC),
+            ]
+        )
+        self.tick([lambda: self.data_path.signal_latch_next(MUX.NEXT_MEM)])
+        self.drop()
+
+    def loop(self, memory_cell: dict):
+        self.tick([lambda: self.data_path.signal_latch_loop_index(MUX.INDEX_INC)])
+        if self.data_path.loop_index < self.data_path.loop_limit:
+            self.tick([lambda: self.signal_latch_pc(MUX.PC_IMMEDIATE, memory_cell["arg"])])
+            return
+        self.tick([lambda: self.data_path.signal_latch_loop_depth(MUX.LOOP_DEPTH_DEC)])
+        if self.data_path.loop_depth > 0:
+            # Выход из вложенного цикла: регистры внешнего цикла восстанавливаются со стека возврата
+            self.tick([lambda: self.data_path.signal_latch_i(MUX.I_DEC)])
+            self.tick(
+                [
+                    lambda: self.data_path.signal_latch_loop_index(MUX.INDEX_RETURN),
+                    lambda: self.data_path.signal_latch_i(MUX.I_DEC),
+                ]
+            )
+            self.tick([lambda: self.data_path.signal_latch_loop_limit(MUX.LIMIT_RETURN)])
+
+    def index(self):
+        self.tick([lambda: self.data_path.signal_data_wr()])
+        self.tick(
+            [
+                lambda: self.data_path.signal_latch_stack_pointer(MUX.SP_INC),
+                lambda: self.data_path.signal_latch_next(MUX.NEXT_TOP),
+            ]
+        )
+        self.tick([lambda: self.data_path.signal_latch_top(MUX.TOP_INDEX)])
+
+    def send(self):
+        self.tick([lambda: self.signal_port_write(), lambda: self.data_path.signal_latch_stack_pointer(MUX.SP_DEC)])
+        self.tick([lambda: self.data_path.signal_latch_next(MUX.NEXT_MEM)])
+        self.drop()
+
     def decode_execute(self) -> None:  # noqa: C901 -- function is too complex
         memory_cell = self.program_memory[self.data_path.pc]
         command = memory_cell["command"]
@@ -478,6 +1146,10 @@ class ControlUnit:
             self.emit()
         elif command == OpcodeType.READ:
             self.read()
+        elif command == OpcodeType.TYPE:
+            self.type()
+        elif command == OpcodeType.FIFO:
+            self.push({"arg": 0 if self.input_fifo is None else len(self.input_fifo.buffer)})
         elif command == OpcodeType.SWAP:
             self.swap()
         elif command == OpcodeType.OVER:
@@ -504,11 +1176,22 @@ class ControlUnit:
             self.ei()
         elif command == OpcodeType.RET:
             self.ret()
+        elif command == OpcodeType.DO:
+            self.do()
+        elif command == OpcodeType.LOOP:
+            self.loop(memory_cell)
+        elif command == OpcodeType.INDEX:
+            self.index()
+        elif command == OpcodeType.SEND:
+            self.send()
+        elif command == OpcodeType.CORE_ID:
+            self.push({"arg": self.core_id})
         elif command == OpcodeType.HALT:
             raise StopIteration
 
     def __print__(self, comment: str) -> None:
-        tos_memory = self.data_path.data_stack[self.data_path.sp - 1 : self.data_path.sp - 4 : -1]
+        addresses = range(self.data_path.data_stack_size)[self.data_path.sp - 1 : self.data_path.sp - 4 : -1]
+        tos_memory = [self.data_path.stack_cell(address) for address in addresses]
         tos = [self.data_path.top_of_stack, self.data_path.next, *tos_memory]
         ret_tos = self.data_path.return_stack[self.data_path.i - 1 : self.data_path.i - 4 : -1]
 
@@ -532,36 +1215,163 @@ class ControlUnit:
             ret_tos,
         )
 
-        logger.info(f"{state_repr} {comment}")
+        self.trace(f"{state_repr} {comment}")
 
 
-def simulation(code: list, limit: int, input_tokens: list[tuple]):
-    data_path = DataPath(10000, 10000, 10000, input_tokens)
-    control_unit = ControlUnit(data_path, 10000)
-    control_unit.fill_memory(code)
+def execute(control_unit: ControlUnit, limit: int) -> None:
+    """Исполняет загруженную программу до `halt` или до `limit` инструкций."""
     while control_unit.instruction_number < limit:
         try:
             control_unit.command_cycle()
         except StopIteration:
             break
+        if control_unit.fast_forward is not None:
+            control_unit.fast_forward.observe(control_unit, limit)
+    data_path = control_unit.data_path
+    control_unit.interrupt_stats.finish(control_unit.tick_number, data_path.input_tokens, data_path.tokens_handled)
+
+
+def simulation(
+    code: list,
+    limit: int,
+    input_tokens: list[tuple],
+    interrupt_stats: InterruptStats | None = None,
+    word_cache: WordCache | None = None,
+    fast_forward: FastForward | None = None,
+    host_profile: HostProfile | None = None,
+    input_fifo: InputFifo | None = None,
+    trace: typing.Callable[[str], None] | None = logger.info,
+    stack_registers: int = 2,
+    stack_memory_latency: int = 0,
+    stack_traffic: dict | None = None,
+):
+    """Прогон программы. Состояние модели создаётся заново, трасса пишется в `trace`, поэтому прогоны
+    в разных потоках не мешают друг другу, если у них свои `trace` и объекты режимов. В `stack_traffic`, если он
+    задан, записываются обращения к стеку данных (`stack_reads`, `stack_writes`, `stack_hits`)."""
+    data_path = DataPath(10000, 10000, 10000, input_tokens, stack_registers)
+    control_unit = ControlUnit(data_path, 10000, stack_memory_latency)
+    control_unit.trace = trace
+    if interrupt_stats is not None:
+        control_unit.interrupt_stats = interrupt_stats
+    control_unit.word_cache = word_cache
+    control_unit.fast_forward = fast_forward
+    control_unit.input_fifo = input_fifo
+    if host_profile is not None:
+        host_profile.attach(control_unit)
+    control_unit.fill_memory(code)
+    execute(control_unit, limit)
+    if stack_traffic is not None:
+        stack_traffic.update(
+            stack_reads=data_path.stack_reads, stack_writes=data_path.stack_writes, stack_hits=data_path.stack_hits
+        )
     return [data_path.out_buffer, control_unit.instruction_number, control_unit.tick_number]
 
 
-def main(code_file: str, token_path: str | None) -> None:
+def simulate_batch(runs: list[dict], workers: int) -> list[list]:
+    """Независимые прогоны `simulation(**run)` в пуле из `workers` потоков, результаты в порядке `runs`.
+
+    Трасса отключена, если в `run` не задан свой `trace`. На сборках CPython без GIL прогоны исполняются
+    параллельно, с GIL -- по очереди.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> runs = [{"code": translator.translate(f"1024 {n} . 1024 {n} {n} * ."), "limit": 100, "input_tokens": []} for n in range(4)]
+    >>> [output for output, _, _ in simulate_batch(runs, 2)]
+    ['00', '11', '24', '39']
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda run: simulation(**{"trace": None, **run}), runs))
+
+
+def mode_counters(stack_traffic: dict, skipper: FastForward | None, input_fifo: InputFifo | None) -> dict:
+    """Счётчики включённых режимов моделирования для вывода `main`."""
+    counters = dict(stack_traffic)
+    if skipper is not None:
+        counters.update(fast_forward_skips=skipper.skips, skipped_instructions=skipper.skipped_instructions)
+    if input_fifo is not None:
+        counters.update(fifo_received=input_fifo.received, fifo_overflows=input_fifo.overflows)
+    return counters
+
+
+def main(
+    code_file: str,
+    token_path: str | None = None,
+    stats_path: str | None = None,
+    stack_registers: int = 2,
+    stack_memory_latency: int = 0,
+    fast_forward: int = 0,
+    fifo: int = 0,
+) -> None:
+    """Запуск программы из файла. Если заданы регистры стека или задержка его памяти, выводит и обращения к стеку,
+    при `fast_forward` пропускает активное ожидание (`FastForward`) и выводит число пропусков, при `fifo`
+    подключает буфер ввода такой глубины (`InputFifo`) и выводит число принятых и потерянных токенов.
+
+    Вывод не зависит от числа регистров стека, а такты (при задержке) и обращения к памяти стека -- зависят:
+
+    >>> import os, tempfile, translator
+    >>> directory = tempfile.mkdtemp()
+    >>> source, code_file = os.path.join(directory, "source.fth"), os.path.join(directory, "code.json")
+    >>> with open(source, "w", encoding="utf-8") as file:
+    ...     _ = file.write("1 2 3 4 5 6 7 8 + + + + + + + 1 .")
+    >>> translator.main(source, code_file)
+    source LoC: 1 code instr: 19
+    >>> for stack_registers in (2, 4, 10):
+    ...     main(code_file, stack_registers=stack_registers, stack_memory_latency=2)
+    Output: $
+    Instructions: 19
+    Ticks: 95
+    stack_reads: 9
+    stack_writes: 9
+    stack_hits: 0
+    Output: $
+    Instructions: 19
+    Ticks: 83
+    stack_reads: 6
+    stack_writes: 6
+    stack_hits: 12
+    Output: $
+    Instructions: 19
+    Ticks: 59
+    stack_reads: 0
+    stack_writes: 0
+    stack_hits: 18
+    """
     input_tokens = []
     if token_path:
         with open(token_path, encoding="utf-8") as file:
             input_tokens = eval(file.read())
     code = read_code(code_file)
-    output, instr_num, ticks = simulation(code, limit=55000, input_tokens=input_tokens)
+    interrupt_stats = InterruptStats()
+    stack_traffic = {}
+    skipper = FastForward() if fast_forward else None
+    input_fifo = InputFifo(fifo) if fifo else None
+    output, instr_num, ticks = simulation(
+        code,
+        limit=55000,
+        input_tokens=input_tokens,
+        interrupt_stats=interrupt_stats,
+        stack_registers=stack_registers,
+        stack_memory_latency=stack_memory_latency,
+        stack_traffic=stack_traffic,
+        fast_forward=skipper,
+        input_fifo=input_fifo,
+    )
     print(f"Output: {output}\nInstructions: {instr_num}\nTicks: {ticks - 1}")
+    stack_traffic = stack_traffic if stack_registers > 2 or stack_memory_latency else {}
+    for key, value in mode_counters(stack_traffic, skipper, input_fifo).items():
+        print(f"{key}: {value}")
+    if stats_path:
+        interrupt_stats.write_csv(stats_path)
+        for key, value in interrupt_stats.summary().items():
+            print(f"{key}: {value}")
+        print(f"out_chars_per_tick: {len(output) / ticks:.4f}")
 
 
 if __name__ == "__main__":
-    assert 2 <= len(sys.argv) <= 3, "Неверные аргументы: machine.py <code_file> <input_file>"
-    if len(sys.argv) == 3:
-        _, code_file, input_file = sys.argv
-    else:
-        _, code_file = sys.argv
-        input_file = None
-    main(code_file, input_file)
+    options = dict(pair.split("=") for pair in sys.argv[2:] if "=" in pair)
+    assert 2 <= len(sys.argv) - len(options) <= 4, (
+        "Неверные аргументы: machine.py <code_file> [<input_file> [<stats_csv>]]"
+        " [stack_registers=N] [stack_memory_latency=L] [fast_forward=1] [fifo=DEPTH]"
+    )
+    _, code_file, *optional = (argument for argument in sys.argv if "=" not in argument)
+    main(code_file, *optional, **{key: int(value) for key, value in options.items()})
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import multiprocessing
+import sys
+import threading
+from multiprocessing import shared_memory
+
+from isa import read_code
+from machine import ControlUnit, DataPath
+
+MEMORY_SIZE = 10000
+STACK_SIZE = 10000
+PROGRAM_MEMORY_SIZE = 10000
+MEMORY_FILL = 2048
+# Ячейка общей памяти в процессном режиме -- 64-битное целое со знаком
+WORD_MIN, WORD_MAX = -(2**63), 2**63 - 1
+
+
+class SharedWords:
+    """Память данных над `multiprocessing.shared_memory`: 64-битные ячейки с проверкой адреса и значения.
+
+    >>> memory = SharedWords(memoryview(bytearray(16)).cast("q"))
+    >>> memory[1] = -5
+    >>> memory[1], len(memory)
+    (-5, 2)
+    >>> memory[0] = 2**63  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    AssertionError: Значение 9223372036854775808 не помещается в ячейку общей памяти...
+    >>> memory[2]  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    AssertionError: Адрес 2 вне общей памяти...
+    """
+
+    __slots__ = ("words",)
+
+    def __init__(self, words: memoryview):
+        self.words = words
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def check_address(self, address: int) -> None:
+        assert 0 <= address < len(self.words), f"Адрес {address} вне общей памяти"
+
+    def __getitem__(self, address: int) -> int:
+        self.check_address(address)
+        return self.words[address]
+
+    def __setitem__(self, address: int, value: int) -> None:
+        self.check_address(address)
+        assert WORD_MIN <= value <= WORD_MAX, f"Значение {value} не помещается в ячейку общей памяти"
+        self.words[address] = value
+
+
+def make_core(core_id: int, code: list, input_tokens: list[tuple], memory) -> ControlUnit:
+    data_path = DataPath(len(memory), STACK_SIZE, STACK_SIZE, input_tokens)
+    data_path.memory = memory
+    control_unit = ControlUnit(data_path, PROGRAM_MEMORY_SIZE)
+    control_unit.core_id = core_id
+    control_unit.fill_memory(code)
+    return control_unit
+
+
+def step(control_unit: ControlUnit) -> bool:
+    """Одна инструкция ядра. Возвращает False, если ядро остановилось."""
+    try:
+        control_unit.command_cycle()
+    except StopIteration:
+        return False
+    return True
+
+
+def core_result(control_unit: ControlUnit) -> list:
+    data_path = control_unit.data_path
+    control_unit.interrupt_stats.finish(control_unit.tick_number, data_path.input_tokens, data_path.tokens_handled)
+    return [data_path.out_buffer, control_unit.instruction_number, control_unit.tick_number]
+
+
+class MultiCoreMachine:
+    """Несколько ControlUnit со своими стеками и PC над общей памятью данных.
+
+    Ядра исполняются в одном процессе детерминированно:
+
+    * `round_robin` - ядра по очереди выполняют по одной инструкции;
+    * `tick` - следующую инструкцию выполняет ядро с наименьшим номером такта (при равенстве - с меньшим
+      номером ядра), что моделирует одновременную работу ядер.
+
+    Команда `send` ( value core -- ) передаёт значение в порт ядра `core`: оно становится токеном ввода
+    с тактом отправителя и вызывает прерывание, в обработчике значение читается командой `read`.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(
+    ...     ":intr h 0 read 11 emit cnt @ 1 + cnt ! ei ; variable cnt "
+    ...     "coreid 0 = if 72 1 send 105 1 send else 0 cnt ! begin cnt @ 2 = until then"
+    ... )
+    >>> [output for output, _, _ in MultiCoreMachine([code, code], scheduling="round_robin").run(10000)]
+    ['', 'Hi']
+    """
+
+    schedulings = ("round_robin", "tick")
+
+    def __init__(self, programs: list[list], input_tokens: list[list[tuple]] | None = None, scheduling="tick"):
+        assert programs, "Нужно хотя бы одно ядро"
+        assert scheduling in self.schedulings, f"Неизвестное планирование: {scheduling}"
+        input_tokens = input_tokens or [[] for _ in programs]
+        self.scheduling = scheduling
+        self.memory = [MEMORY_FILL] * MEMORY_SIZE
+        self.cores = [
+            make_core(core_id, code, tokens, self.memory)
+            for core_id, (code, tokens) in enumerate(zip(programs, input_tokens))
+        ]
+        for control_unit in self.cores:
+            control_unit.message_port = self.send
+
+    def send(self, target: int, value: int, tick_number: int) -> None:
+        assert 0 <= target < len(self.cores), f"Нет ядра #{target}"
+        self.cores[target].deliver_message(tick_number, value)
+
+    def next_core(self, running: list[ControlUnit], last: int) -> ControlUnit:
+        if self.scheduling == "tick":
+            return min(running, key=lambda control_unit: (control_unit.tick_number, control_unit.core_id))
+        return running[(last + 1) % len(running)]
+
+    def run(self, limit: int) -> list[list]:
+        running = list(self.cores)
+        last = -1
+        while running:
+            control_unit = self.next_core(running, last)
+            last = running.index(control_unit)
+            if not step(control_unit) or control_unit.instruction_number >= limit:
+                running.remove(control_unit)
+                last -= 1
+        return [core_result(control_unit) for control_unit in self.cores]
+
+
+def run_quanta(control_unit: ControlUnit, core_id: int, sync: dict) -> None:
+    outbox = []
+    control_unit.message_port = lambda target, value, tick_number: outbox.append((target, tick_number, value))
+    running, received, boundary = True, 0, sync["quantum"]
+    while True:
+        while running and control_unit.tick_number < boundary:
+            running = step(control_unit) and control_unit.instruction_number < sync["limit"]
+        sync["halted"][core_id] = int(not running)
+        for target, tick_number, value in outbox:
+            with sync["counts"].get_lock():
+                sync["counts"][target] += 1
+            sync["queues"][target].put((tick_number, core_id, value))
+        outbox.clear()
+        sync["barrier"].wait()
+        messages = [sync["queues"][core_id].get() for _ in range(sync["counts"][core_id] - received)]
+        received += len(messages)
+        for tick_number, _, value in sorted(messages):
+            control_unit.deliver_message(tick_number, value)
+        all_halted = all(sync["halted"])
+        sync["barrier"].wait()
+        if all_halted:
+            return
+        boundary += sync["quantum"]
+
+
+def run_core_process(core_id: int, code: list, input_tokens: list[tuple], shm_name: str, sync: dict) -> None:
+    """Ядро в отдельном процессе. Синхронизация с остальными -- на границах квантов по `quantum` тактов.
+
+    Сообщения, отправленные за квант, доставляются получателю на границе кванта в порядке
+    (такт отправки, ядро-отправитель), поэтому их обработка детерминирована с точностью до кванта.
+    Обращения к общей памяти данных внутри кванта не упорядочены между ядрами. Ошибка в ядре ломает барьер,
+    чтобы остальные ядра не ждали его, и возвращается вместо результата.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    memory = shm.buf.cast("q")
+    control_unit = make_core(core_id, code, input_tokens, SharedWords(memory))
+    try:
+        run_quanta(control_unit, core_id, sync)
+        result = core_result(control_unit)
+    except Exception as error:
+        sync["barrier"].abort()
+        result = error
+    sync["results"].put((core_id, result))
+    control_unit.data_path.memory = None
+    memory.release()
+    shm.close()
+
+
+def run_processes(programs: list[list], input_tokens: list[list[tuple]] | None, limit: int, quantum: int) -> list:
+    """Ядра в отдельных процессах над `multiprocessing.shared_memory`.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(
+    ...     ":intr h 0 read 11 emit cnt @ 1 + cnt ! ei ; variable cnt "
+    ...     "coreid 0 = if 72 1 send 105 1 send else 0 cnt ! begin cnt @ 2 = until then"
+    ... )
+    >>> [output for output, _, _ in run_processes([code, code], None, limit=10000, quantum=100)]
+    ['', 'Hi']
+    """
+    input_tokens = input_tokens or [[] for _ in programs]
+    shm = shared_memory.SharedMemory(create=True, size=MEMORY_SIZE * 8)
+    try:
+        memory = shm.buf.cast("q")
+        for address in range(MEMORY_SIZE):
+            memory[address] = MEMORY_FILL
+        memory.release()
+        sync = {
+            "quantum": quantum,
+            "limit": limit,
+            "barrier": multiprocessing.Barrier(len(programs)),
+            "queues": [multiprocessing.Queue() for _ in programs],
+            "counts": multiprocessing.Array("i", len(programs)),
+            "halted": multiprocessing.Array("i", len(programs)),
+            "results": multiprocessing.Queue(),
+        }
+        processes = [
+            multiprocessing.Process(target=run_core_process, args=(core_id, code, tokens, shm.name, sync))
+            for core_id, (code, tokens) in enumerate(zip(programs, input_tokens))
+        ]
+        for process in processes:
+            process.start()
+        results = dict(sync["results"].get() for _ in processes)
+        for process in processes:
+            process.join()
+        errors = [result for result in results.values() if isinstance(result, Exception)]
+        # Первопричина -- ошибка ядра, остальные ядра получают только сломанный барьер
+        errors.sort(key=lambda error: isinstance(error, threading.BrokenBarrierError))
+        if errors:
+            raise errors[0]
+        return [results[core_id] for core_id in range(len(programs))]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def main(mode: str, core_files: list[str], limit: int = 55000, quantum: int = 100) -> None:
+    programs, input_tokens = [], []
+    for core_file in core_files:
+        code_file, _, token_path = core_file.partition(":")
+        programs.append(read_code(code_file))
+        tokens = []
+        if token_path:
+            with open(token_path, encoding="utf-8") as file:
+                tokens = eval(file.read())
+        input_tokens.append(tokens)
+    if mode == "process":
+        results = run_processes(programs, input_tokens, limit, quantum)
+    else:
+        results = MultiCoreMachine(programs, input_tokens, mode).run(limit)
+    for core_id, (output, instr_num, ticks) in enumerate(results):
+        print(f"Core {core_id}\nOutput: {output}\nInstructions: {instr_num}\nTicks: {ticks - 1}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 3, (
+        "Неверные аргументы: multicore.py <round_robin|tick|process> <code_file>[:<input_file>]..."
+    )
+    main(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from inliner import JUMP_OPCODES, relocated
+from isa import Opcode, OpcodeType
+
+# База правил, построенная superopt.py
+RULES_FILE = Path(__file__).with_name("superopt_rules.json")
+
+
+def load_rules(path: Path = RULES_FILE) -> dict[tuple[OpcodeType, ...], tuple[OpcodeType, ...]]:
+    """Образец -> замена. Без файла базы правил нет."""
+    if not path.exists():
+        return {}
+    rules = json.loads(path.read_text(encoding="utf-8"))["rules"]
+    return {tuple(map(OpcodeType, rule["pattern"])): tuple(map(OpcodeType, rule["replacement"])) for rule in rules}
+
+
+RULES = load_rules()
+
+
+def rewrite(code: list[Opcode], rules: dict, max_length: int) -> tuple[list[Opcode], int]:
+    """Один проход: самые длинные совпадения слева направо. Окно не может содержать цель перехода, кроме
+    своего начала: переход в середину заменённой последовательности некуда перенести."""
+    targets = {opcode.params[0].value for opcode in code if opcode.opcode_type in JUMP_OPCODES}
+    result, address_map, replaced = [], [], 0
+    address = 0
+    while address < len(code):
+        for length in range(min(max_length, len(code) - address), 1, -1):
+            window = tuple(opcode.opcode_type for opcode in code[address : address + length])
+            if window in rules and not targets & set(range(address + 1, address + length)):
+                address_map.extend([len(result)] * length)
+                result.extend(Opcode(command, []) for command in rules[window])
+                address += length
+                replaced += 1
+                break
+        else:
+            address_map.append(len(result))
+            result.append(code[address])
+            address += 1
+    address_map.append(len(result))
+    for address, opcode in enumerate(result):
+        if opcode.opcode_type in JUMP_OPCODES:
+            result[address] = relocated(opcode, address_map[opcode.params[0].value])
+    return result, replaced
+
+
+def optimize_sequences(code: list[Opcode], rules: dict | None = None) -> tuple[list[Opcode], int]:
+    """Заменяет последовательности команд более дешёвыми эквивалентами, пока правила применяются.
+
+    Каждая замена уменьшает число тактов, поэтому повторение конечно. Возвращает код и число замен.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> [str(cell["command"]) for cell in translator.translate("1 2 over over + swap drop swap drop")]
+    ['jmp', 'push', 'push', 'add', 'halt']
+    >>> names = "rpop rpop over over pop pop swap drop".split()
+    >>> code, rewrites = optimize_sequences([Opcode(OpcodeType(name), []) for name in names])
+    >>> [str(opcode.opcode_type) for opcode in code], rewrites
+    (['rpop', 'rpop', 'dup', 'pop', 'swap', 'pop'], 3)
+    """
+    rules = RULES if rules is None else rules
+    max_length = max(map(len, rules), default=0)
+    total = 0
+    while True:
+        code, replaced = rewrite(code, rules, max_length)
+        total += replaced
+        if not replaced:
+            return code, total
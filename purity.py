@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from inliner import find_words
+from isa import Opcode, OpcodeType
+
+# Эффект команды на стек данных: (сколько значений читает со стека, сколько оставляет вместо них)
+STACK_EFFECTS = {
+    OpcodeType.ADD: (2, 1),
+    OpcodeType.SUB: (2, 1),
+    OpcodeType.DIV: (2, 1),
+    OpcodeType.MOD: (2, 1),
+    OpcodeType.EQ: (2, 1),
+    OpcodeType.LS: (2, 1),
+    OpcodeType.OR: (2, 1),
+    OpcodeType.MUL: (2, 1),
+    OpcodeType.AND: (2, 1),
+    OpcodeType.XOR: (2, 1),
+    OpcodeType.LSHIFT: (2, 1),
+    OpcodeType.RSHIFT: (2, 1),
+    OpcodeType.NEGATE: (1, 1),
+    OpcodeType.DUP: (1, 2),
+    OpcodeType.DROP: (1, 0),
+    OpcodeType.SWAP: (2, 2),
+    OpcodeType.OVER: (2, 3),
+    OpcodeType.PUSH: (0, 1),
+    OpcodeType.ZJMP: (1, 0),
+    OpcodeType.JMP: (0, 0),
+}
+
+
+class PurityAnalysis:
+    """Чистые слова: работают только со своими аргументами на стеке данных.
+
+    В теле чистого слова только арифметика, операции со стеком, константы, переходы внутри слова и вызовы
+    чистых слов (в том числе хвостовые). Глубина стека в каждой точке слова должна быть одинаковой на всех
+    путях, тогда эффект слова на стек `(аргументов, результатов)` известен статически.
+    """
+
+    def __init__(self, code: list[Opcode]):
+        self.code = code
+        self.words = find_words(code)
+        self.effects = {}
+        self.in_progress = set()
+
+    def callee_effect(self, opcode: Opcode) -> tuple[int, int] | None:
+        target = opcode.params[0].value
+        if opcode.opcode_type is OpcodeType.JMP and target not in self.words:
+            return STACK_EFFECTS[OpcodeType.JMP]
+        return self.effect(target) if target in self.words else None
+
+    def instruction_effect(self, address: int) -> tuple[tuple[int, int] | None, list[int | None]]:
+        """Эффект команды и адреса, куда она передаёт управление (`None` -- выход из слова)."""
+        opcode = self.code[address]
+        if opcode.opcode_type is OpcodeType.CALL:
+            return self.callee_effect(opcode), [address + 1]
+        if opcode.opcode_type is OpcodeType.JMP:
+            target = opcode.params[0].value
+            return self.callee_effect(opcode), [None if target in self.words else target]
+        if opcode.opcode_type is OpcodeType.ZJMP:
+            return STACK_EFFECTS[OpcodeType.ZJMP], [address + 1, opcode.params[0].value]
+        return STACK_EFFECTS.get(opcode.opcode_type), [address + 1]
+
+    def effect(self, entry: int) -> tuple[int, int] | None:
+        if entry not in self.effects:
+            if entry in self.in_progress:
+                return None
+            self.in_progress.add(entry)
+            self.effects[entry] = self.analyze(entry, self.words[entry])
+            self.in_progress.discard(entry)
+        return self.effects[entry]
+
+    @staticmethod
+    def follow(targets: list[int | None], depth: int, depths: dict, exits: set, bounds: tuple[int, int]) -> bool:
+        """Переносит глубину стека на адреса перехода. `False`, если глубины на разных путях расходятся."""
+        entry, ret = bounds
+        for target in targets:
+            if target is None or target == ret:
+                exits.add(depth)
+            elif not entry <= target < ret or depths.setdefault(target, depth) != depth:
+                return False
+        return True
+
+    def analyze(self, entry: int, ret: int) -> tuple[int, int] | None:
+        depths = {entry: 0}
+        exits = set()
+        inputs = 0
+        for address in range(entry, ret):
+            if address not in depths:
+                continue
+            effect, targets = self.instruction_effect(address)
+            if effect is None:
+                return None
+            popped, pushed = effect
+            inputs = max(inputs, popped - depths[address])
+            if not self.follow(targets, depths[address] - popped + pushed, depths, exits, (entry, ret)):
+                return None
+        if len(exits) != 1:
+            return None
+        return inputs, inputs + exits.pop()
+
+
+def find_pure_words(code: list[Opcode]) -> dict[int, tuple[int, int]]:
+    """Адрес начала чистого слова -> (аргументов, результатов).
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(
+    ...     ": sq dup dup + + ; : clamp dup 9 < if drop 9 then ; : show 11 emit ; 3 sq clamp show",
+    ...     inline_size=0, loop_inline_size=0,
+    ... )
+    >>> [(cell["index"], cell["pure"]) for cell in code if "pure" in cell]
+    [(2, [1, 1]), (8, [1, 1])]
+    """
+    analysis = PurityAnalysis(code)
+    return {entry: effect for entry in analysis.words if (effect := analysis.effect(entry)) is not None}
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import itertools
+import json
+import sys
+from pathlib import Path
+
+from isa import OpcodeType
+from wcet import TickCosts
+
+RULES_FILE = Path(__file__).with_name("superopt_rules.json")
+# Команды без побочных эффектов и без аргументов: операции со стеками и АЛУ. `div`, `mod` и сдвиги не входят --
+# их удаление или перенос меняет поведение при делении на 0 и отрицательном сдвиге
+ALPHABET = (
+    OpcodeType.DUP,
+    OpcodeType.DROP,
+    OpcodeType.SWAP,
+    OpcodeType.OVER,
+    OpcodeType.POP,
+    OpcodeType.RPOP,
+    OpcodeType.ADD,
+    OpcodeType.SUB,
+    OpcodeType.MUL,
+    OpcodeType.AND,
+    OpcodeType.OR,
+    OpcodeType.XOR,
+    OpcodeType.EQ,
+    OpcodeType.LS,
+    OpcodeType.NEGATE,
+)
+BINARY = (
+    OpcodeType.ADD,
+    OpcodeType.SUB,
+    OpcodeType.MUL,
+    OpcodeType.AND,
+    OpcodeType.OR,
+    OpcodeType.XOR,
+    OpcodeType.EQ,
+    OpcodeType.LS,
+)
+COMMUTATIVE = (OpcodeType.ADD, OpcodeType.MUL, OpcodeType.AND, OpcodeType.OR, OpcodeType.XOR, OpcodeType.EQ)
+# Сколько значений команда читает со стека данных и со стека возврата
+READS = {
+    OpcodeType.DUP: (1, 0),
+    OpcodeType.DROP: (1, 0),
+    OpcodeType.SWAP: (2, 0),
+    OpcodeType.OVER: (2, 0),
+    OpcodeType.POP: (1, 0),
+    OpcodeType.RPOP: (0, 1),
+    OpcodeType.NEGATE: (1, 0),
+    **{command: (2, 0) for command in BINARY},
+}
+# Символов на входе каждого стека: с запасом для последовательностей длиной до 8
+SYMBOLS = 16
+
+
+STACK_OPERATIONS = {
+    OpcodeType.DUP: lambda data, ret: data.append(data[-1]),
+    OpcodeType.DROP: lambda data, ret: data.pop(),
+    OpcodeType.SWAP: lambda data, ret: data.extend([data.pop(), data.pop()]),
+    OpcodeType.OVER: lambda data, ret: data.append(data[-2]),
+    OpcodeType.POP: lambda data, ret: ret.append(data.pop()),
+    OpcodeType.RPOP: lambda data, ret: data.append(ret.pop()),
+}
+
+
+def execute(data: list, ret: list, command: OpcodeType) -> None:
+    if command in STACK_OPERATIONS:
+        STACK_OPERATIONS[command](data, ret)
+    elif command is OpcodeType.NEGATE:
+        data.append((str(command), data.pop()))
+    else:
+        # Операнды: вершина стека и значение под ней, у коммутативных операций порядок не важен
+        top, below = data.pop(), data.pop()
+        operands = sorted((below, top), key=repr) if command in COMMUTATIVE else [below, top]
+        data.append((str(command), *operands))
+
+
+def symbolic_effect(sequence: tuple[OpcodeType, ...]) -> tuple[tuple, tuple, int, int]:
+    """Состояние стеков после `sequence` в виде выражений от входных значений и глубина чтения стеков.
+
+    Две последовательности эквивалентны, если после них совпадают оба стека целиком: значения под
+    прочитанными остаются теми же символами.
+
+    >>> symbolic_effect((OpcodeType.SWAP, OpcodeType.ADD)) == symbolic_effect((OpcodeType.ADD,))
+    True
+    >>> symbolic_effect((OpcodeType.SWAP, OpcodeType.SUB)) == symbolic_effect((OpcodeType.SUB,))
+    False
+    >>> symbolic_effect((OpcodeType.OVER, OpcodeType.OVER))[2:]
+    (2, 0)
+    """
+    data = [("d", idx) for idx in reversed(range(SYMBOLS))]
+    ret = [("r", idx) for idx in reversed(range(SYMBOLS))]
+    data_depth, ret_depth = 0, 0
+    for command in sequence:
+        data_reads, ret_reads = READS[command]
+        data_depth = max(data_depth, data_reads - len(data) + SYMBOLS)
+        ret_depth = max(ret_depth, ret_reads - len(ret) + SYMBOLS)
+        execute(data, ret, command)
+    return tuple(data), tuple(ret), data_depth, ret_depth
+
+
+def superoptimize(max_length: int, costs: TickCosts | None = None) -> list[dict]:
+    """Правила `pattern -> replacement` для последовательностей из `ALPHABET` длиной от 2 до `max_length`.
+
+    Замена -- самая дешёвая по тактам `ControlUnit` эквивалентная последовательность длиной до `max_length`,
+    которая читает стеки не глубже образца. Образцы, содержащие более короткий образец, не сохраняются:
+    их сократит повторное применение правил.
+    """
+    costs = costs or TickCosts()
+    # Эффект на стеки -> последовательности с этим эффектом (такты, длина, команды, глубина чтения стеков)
+    classes = {}
+    for length in range(max_length + 1):
+        for sequence in itertools.product(ALPHABET, repeat=length):
+            data, ret, data_depth, ret_depth = symbolic_effect(sequence)
+            cost = sum(costs.commands[command] for command in sequence)
+            classes.setdefault((data, ret), []).append((cost, length, sequence, (data_depth, ret_depth)))
+    for candidates in classes.values():
+        candidates.sort(key=lambda candidate: candidate[:2])
+    patterns, rules = set(), []
+    for cost, length, sequence, depths, candidates in sorted(
+        ((*candidate, candidates) for candidates in classes.values() for candidate in candidates),
+        key=lambda candidate: candidate[1],
+    ):
+        if length < 2 or any(
+            sequence[start : start + size] in patterns
+            for size in range(2, length)
+            for start in range(length - size + 1)
+        ):
+            continue
+        best = next(candidate for candidate in candidates if all(map(int.__le__, candidate[3], depths)))
+        if best[0] < cost:
+            patterns.add(sequence)
+            rules.append(
+                {
+                    "pattern": [str(command) for command in sequence],
+                    "replacement": [str(command) for command in best[2]],
+                    "saved_ticks": cost - best[0],
+                }
+            )
+    return rules
+
+
+def write_rules(path: Path, max_length: int, rules: list[dict]) -> None:
+    lines = [json.dumps(rule) for rule in rules]
+    path.write_text(f'{{"max_length": {max_length}, "rules": [\n ' + ",\n ".join(lines) + "\n]}\n", encoding="utf-8")
+
+
+def main(max_length: int, path: Path) -> None:
+    rules = superoptimize(max_length)
+    write_rules(path, max_length, rules)
+    print(f"rules: {len(rules)}")
+    for rule in sorted(rules, key=lambda rule: -rule["saved_ticks"])[:10]:
+        print(
+            f"{' '.join(rule['pattern']):>32} -> {' '.join(rule['replacement']) or '(пусто)'}: -{rule['saved_ticks']}"
+        )
+
+
+if __name__ == "__main__":
+    assert 2 <= len(sys.argv) <= 3, "Неверные аргументы: superopt.py <max_length> [<rules_file>]"
+    main(int(sys.argv[1]), Path(sys.argv[2]) if len(sys.argv) == 3 else RULES_FILE)
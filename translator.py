@@ -2,8 +2,16 @@ from __future__ import annotations
 
 import shlex
 import sys
+import typing
 
+from inliner import optimize_calls
 from isa import Opcode, OpcodeParam, OpcodeParamType, OpcodeType, TermType, write_code
+from peephole import optimize_sequences
+from purity import find_pure_words
+
+# Слова не длиннее INLINE_SIZE инструкций подставляются везде, внутри циклов -- не длиннее LOOP_INLINE_SIZE
+INLINE_SIZE = 4
+LOOP_INLINE_SIZE = 32
 
 
 def word_to_term(word: str) -> Term | None:
@@ -17,6 +25,8 @@ def word_to_term(word: str) -> Term | None:
         "mod": TermType.MOD,
         "emit": TermType.EMIT,
         "read": TermType.READ,
+        "type": TermType.TYPE,
+        "fifo": TermType.FIFO,
         "swap": TermType.SWAP,
         "drop": TermType.DROP,
         "over": TermType.OVER,
@@ -39,10 +49,20 @@ def word_to_term(word: str) -> Term | None:
         "until": TermType.UNTIL,
         "i": TermType.LOOP_CNT,
         "or": TermType.OR,
+        "*": TermType.MUL,
+        "and": TermType.AND,
+        "xor": TermType.XOR,
+        "lshift": TermType.LSHIFT,
+        "rshift": TermType.RSHIFT,
+        "negate": TermType.NEGATE,
+        "send": TermType.SEND,
+        "coreid": TermType.CORE_ID,
     }.get(word)
 
 
 class Term:
+    __slots__ = ("converted", "operand", "term_type", "word", "word_number")
+
     def __init__(self, word_number: int, term_type: TermType | None, word: str):
         self.converted = False
         self.operand = None
@@ -51,10 +71,112 @@ class Term:
         self.word = word
 
 
+# Шаблоны кода для каждого типа терма. Они разделяются всеми термами, опкоды с исправляемыми параметрами попадают
+# в код копиями (`instantiate`).
+TERM_TEMPLATES: dict[TermType, tuple[Opcode, ...]] = {
+    TermType.DI: (Opcode(OpcodeType.DI, []),),
+    TermType.EI: (Opcode(OpcodeType.EI, []),),
+    TermType.DUP: (Opcode(OpcodeType.DUP, []),),
+    TermType.ADD: (Opcode(OpcodeType.ADD, []),),
+    TermType.OR: (Opcode(OpcodeType.OR, []),),
+    TermType.MUL: (Opcode(OpcodeType.MUL, []),),
+    TermType.AND: (Opcode(OpcodeType.AND, []),),
+    TermType.XOR: (Opcode(OpcodeType.XOR, []),),
+    TermType.LSHIFT: (Opcode(OpcodeType.LSHIFT, []),),
+    TermType.RSHIFT: (Opcode(OpcodeType.RSHIFT, []),),
+    TermType.NEGATE: (Opcode(OpcodeType.NEGATE, []),),
+    TermType.SUB: (Opcode(OpcodeType.SUB, []),),
+    TermType.DIV: (Opcode(OpcodeType.DIV, []),),
+    TermType.MOD: (Opcode(OpcodeType.MOD, []),),
+    TermType.EMIT: (Opcode(OpcodeType.EMIT, []),),
+    TermType.SWAP: (Opcode(OpcodeType.SWAP, []),),
+    TermType.DROP: (Opcode(OpcodeType.DROP, []),),
+    TermType.OVER: (Opcode(OpcodeType.OVER, []),),
+    TermType.EQ: (Opcode(OpcodeType.EQ, []),),
+    TermType.LS: (Opcode(OpcodeType.LS, []),),
+    TermType.READ: (Opcode(OpcodeType.READ, []),),
+    TermType.TYPE: (Opcode(OpcodeType.TYPE, []),),
+    TermType.FIFO: (Opcode(OpcodeType.FIFO, []),),
+    TermType.VARIABLE: (),
+    TermType.ALLOT: (),
+    TermType.STORE: (Opcode(OpcodeType.STORE, []),),
+    TermType.LOAD: (Opcode(OpcodeType.LOAD, []),),
+    TermType.IF: (Opcode(OpcodeType.ZJMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+    TermType.ELSE: (Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+    TermType.THEN: (),
+    TermType.DEF: (Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+    TermType.RET: (Opcode(OpcodeType.RET, []),),
+    TermType.DEF_INTR: (),
+    TermType.DO: (Opcode(OpcodeType.DO, []),),
+    TermType.LOOP: (Opcode(OpcodeType.LOOP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+    TermType.BEGIN: (),
+    TermType.UNTIL: (Opcode(OpcodeType.ZJMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+    TermType.LOOP_CNT: (Opcode(OpcodeType.INDEX, []),),
+    TermType.SEND: (Opcode(OpcodeType.SEND, []),),
+    TermType.CORE_ID: (Opcode(OpcodeType.CORE_ID, []),),
+    TermType.CALL: (Opcode(OpcodeType.CALL, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+    TermType.ENTRYPOINT: (Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),),
+}
+
+
+def rel(offset: int) -> list[OpcodeParam]:
+    return [OpcodeParam(OpcodeParamType.ADDR_REL, offset)]
+
+
+def const(value: int) -> list[OpcodeParam]:
+    return [OpcodeParam(OpcodeParamType.CONST, value)]
+
+
+# Печать строки (порт адрес -- ): по адресу лежит длина строки, за ней символы. Порт на время цикла хранится на
+# стеке возврата.
+PRINT_LOOP = (
+    Opcode(OpcodeType.SWAP, []),
+    Opcode(OpcodeType.POP, []),
+    Opcode(OpcodeType.DUP, []),
+    Opcode(OpcodeType.LOAD, []),
+    Opcode(OpcodeType.DUP, []),
+    Opcode(OpcodeType.ZJMP, rel(14)),
+    Opcode(OpcodeType.SWAP, []),
+    Opcode(OpcodeType.PUSH, const(1)),
+    Opcode(OpcodeType.ADD, []),
+    Opcode(OpcodeType.DUP, []),
+    Opcode(OpcodeType.LOAD, []),
+    Opcode(OpcodeType.RPOP, []),
+    Opcode(OpcodeType.DUP, []),
+    Opcode(OpcodeType.POP, []),
+    Opcode(OpcodeType.EMIT, []),
+    Opcode(OpcodeType.SWAP, []),
+    Opcode(OpcodeType.PUSH, const(1)),
+    Opcode(OpcodeType.SUB, []),
+    Opcode(OpcodeType.JMP, rel(-14)),
+    Opcode(OpcodeType.DROP, []),
+    Opcode(OpcodeType.DROP, []),
+    Opcode(OpcodeType.RPOP, []),
+    Opcode(OpcodeType.DROP, []),
+)
+# Подпрограмма print_string: при первом вызове записывает все строки в память данных
+PRINT_STRING = (
+    Opcode(OpcodeType.CALL, [OpcodeParam(OpcodeParamType.RUNTIME, "init_strings")]),
+    *PRINT_LOOP,
+    Opcode(OpcodeType.RET, []),
+)
+
+# Память данных: строковые литералы с адреса 0, в последней ячейке их области -- признак записи строк
+# подпрограммой init_strings, переменные с адреса VARIABLES_ADDRESS
+VARIABLES_ADDRESS = 512
+STRINGS_FLAG_ADDRESS = VARIABLES_ADDRESS - 1
+
 variables = {}
-variable_address = 512
+variable_address = VARIABLES_ADDRESS
 string_address = 0
+# Содержимое строкового литерала -> адрес в памяти данных, одинаковые строки хранятся один раз
+strings = {}
+# Печать строк подпрограммой print_string (иначе -- на месте каждого литерала)
+print_routine = False
 functions = {}
+call_report = {}
+# Адрес начала чистого слова -> (аргументов, результатов)
+pure_words = {}
 
 
 def split_to_terms(source_code: str) -> list[Term]:
@@ -77,7 +199,8 @@ def validate_indexes(terms: list[Term], begin: TermType, end: TermType, error: s
             start_indexes.append(idx)
         if term.term_type == end:
             assert start_indexes, f"{error} в слове #{term.word_number}"
-            term.operand = start_indexes.pop()
+            # Переход на терм, следующий за открывающим словом цикла
+            term.operand = start_indexes.pop() + 1
     assert not start_indexes, error
 
 
@@ -182,145 +305,165 @@ def validate_and_correct_terms(terms: list[Term]) -> None:
 
 
 def fix_literal(term: Term) -> list[Opcode]:
-    global string_address
     if term.converted:
         return []
     if term.term_type != TermType.STRING:
-        return [Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, term.word)])]
+        return [Opcode(OpcodeType.PUSH, const(term.word))]
 
-    opcodes = []
     content = term.word[2:-1]
-    string_start = string_address
-
-    opcodes.append(Opcode(OpcodeType.POP, []))
-    opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, len(content))]))
-    opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, string_address)]))
-    opcodes.append(Opcode(OpcodeType.STORE, []))
-    string_address += 1
-
-    for char in content:
-        opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, ord(char))]))
-        opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, string_address)]))
-        opcodes.append(Opcode(OpcodeType.STORE, []))
-        string_address += 1
-
-    opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, string_start)]))
-    opcodes.append(Opcode(OpcodeType.LOAD, []))
-    opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, string_start)]))
-    opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, 1)]))
-    opcodes.append(Opcode(OpcodeType.ADD, []))
-    opcodes.append(Opcode(OpcodeType.OVER, []))
-    opcodes.append(Opcode(OpcodeType.ZJMP, [OpcodeParam(OpcodeParamType.ADDR_REL, 12)]))
-    opcodes.append(Opcode(OpcodeType.DUP, []))
-    opcodes.append(Opcode(OpcodeType.LOAD, []))
-    opcodes.append(Opcode(OpcodeType.RPOP, []))
-    opcodes.append(Opcode(OpcodeType.DUP, []))
-    opcodes.append(Opcode(OpcodeType.POP, []))
-    opcodes.append(Opcode(OpcodeType.EMIT, []))
-    opcodes.append(Opcode(OpcodeType.SWAP, []))
-    opcodes.append(Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, 1)]))
-    opcodes.append(Opcode(OpcodeType.SUB, []))
-    opcodes.append(Opcode(OpcodeType.SWAP, []))
-    opcodes.append(Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.ADDR_REL, -14)]))
-
-    return opcodes
-
-
-def term2opcodes(term: Term) -> list[Opcode]:
-    opcodes = {
-        TermType.DI: [Opcode(OpcodeType.DI, [])],
-        TermType.EI: [Opcode(OpcodeType.EI, [])],
-        TermType.DUP: [Opcode(OpcodeType.DUP, [])],
-        TermType.ADD: [Opcode(OpcodeType.ADD, [])],
-        TermType.OR: [Opcode(OpcodeType.OR, [])],
-        TermType.SUB: [Opcode(OpcodeType.SUB, [])],
-        TermType.DIV: [Opcode(OpcodeType.DIV, [])],
-        TermType.MOD: [Opcode(OpcodeType.MOD, [])],
-        TermType.EMIT: [Opcode(OpcodeType.EMIT, [])],
-        TermType.SWAP: [Opcode(OpcodeType.SWAP, [])],
-        TermType.DROP: [Opcode(OpcodeType.DROP, [])],
-        TermType.OVER: [Opcode(OpcodeType.OVER, [])],
-        TermType.EQ: [Opcode(OpcodeType.EQ, [])],
-        TermType.LS: [Opcode(OpcodeType.LS, [])],
-        TermType.READ: [Opcode(OpcodeType.READ, [])],
-        TermType.VARIABLE: [],
-        TermType.ALLOT: [],
-        TermType.STORE: [Opcode(OpcodeType.STORE, [])],
-        TermType.LOAD: [Opcode(OpcodeType.LOAD, [])],
-        TermType.IF: [Opcode(OpcodeType.ZJMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)])],
-        TermType.ELSE: [Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)])],
-        TermType.THEN: [],
-        TermType.DEF: [Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)])],
-        TermType.RET: [Opcode(OpcodeType.RET, [])],
-        TermType.DEF_INTR: [],
-        TermType.DO: [
-            Opcode(OpcodeType.DI, []),
-            Opcode(OpcodeType.POP, []),
-            Opcode(OpcodeType.POP, []),
-            Opcode(OpcodeType.EI, []),
-        ],
-        TermType.LOOP: [
-            Opcode(OpcodeType.DI, []),
-            Opcode(OpcodeType.RPOP, []),
-            Opcode(OpcodeType.RPOP, []),
-            Opcode(OpcodeType.PUSH, [OpcodeParam(OpcodeParamType.CONST, 1)]),
-            Opcode(OpcodeType.ADD, []),
-            Opcode(OpcodeType.OVER, []),
-            Opcode(OpcodeType.OVER, []),
-            Opcode(OpcodeType.LS, []),
-            Opcode(OpcodeType.ZJMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)]),
-            Opcode(OpcodeType.DROP, []),
-            Opcode(OpcodeType.DROP, []),
-            Opcode(OpcodeType.EI, []),
-        ],
-        TermType.BEGIN: [],
-        TermType.UNTIL: [Opcode(OpcodeType.ZJMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)])],
-        TermType.LOOP_CNT: [
-            Opcode(OpcodeType.DI, []),
-            Opcode(OpcodeType.RPOP, []),
-            Opcode(OpcodeType.RPOP, []),
-            Opcode(OpcodeType.OVER, []),
-            Opcode(OpcodeType.OVER, []),
-            Opcode(OpcodeType.POP, []),
-            Opcode(OpcodeType.POP, []),
-            Opcode(OpcodeType.SWAP, []),
-            Opcode(OpcodeType.DROP, []),
-            Opcode(OpcodeType.EI, []),
-        ],
-        TermType.CALL: [Opcode(OpcodeType.CALL, [OpcodeParam(OpcodeParamType.UNDEFINED, None)])],
-        TermType.ENTRYPOINT: [Opcode(OpcodeType.JMP, [OpcodeParam(OpcodeParamType.UNDEFINED, None)])],
-    }.get(term.term_type)
-
-    if term.operand and opcodes is not None:
-        for opcode in opcodes:
-            for param_num, param in enumerate(opcode.params):
-                if param.param_type is OpcodeParamType.UNDEFINED:
-                    opcode.params[param_num].param_type = OpcodeParamType.ADDR
-                    opcode.params[param_num].value = term.operand
-
-    if opcodes is None:
+    address = strings[content]
+    if print_routine:
+        return [
+            Opcode(OpcodeType.PUSH, const(address)),
+            Opcode(OpcodeType.CALL, [OpcodeParam(OpcodeParamType.RUNTIME, "print_string")]),
+        ]
+    return [*string_stores(content, address), Opcode(OpcodeType.PUSH, const(address)), *PRINT_LOOP]
+
+
+def string_stores(content: str, address: int) -> list[Opcode]:
+    """Запись строки в память данных: длина, затем символы, по команде `push; push; store` на ячейку."""
+    stores = []
+    for offset, value in enumerate([len(content), *map(ord, content)]):
+        stores.append(Opcode(OpcodeType.PUSH, const(value)))
+        stores.append(Opcode(OpcodeType.PUSH, const(address + offset)))
+        stores.append(Opcode(OpcodeType.STORE, []))
+    return stores
+
+
+def allocate_strings(terms: list[Term]) -> None:
+    """Размещает строковые литералы в памяти данных и выбирает способ печати.
+
+    Подпрограмма print_string компонуется, только если с ней код короче, чем с печатью на месте каждого
+    литерала: для одной строки печать на месте и короче, и быстрее.
+
+    >>> import translator
+    >>> def layout(source):
+    ...     translator.reset()
+    ...     return len(translator.translate(source)), translator.print_routine
+    >>> layout('11 ." hi"'), layout('11 ." hi" 11 ." hi"'), layout('11 ." hi" 11 ." yo"')
+    ((36, False), (51, True), (60, True))
+    >>> layout('11 ." ' + "a" * 511 + '"')  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    AssertionError: Строковые литералы занимают 512 ячеек, доступно 511...
+    """
+    global string_address, print_routine
+    sites = [term.word[2:-1] for term in terms if term.term_type is TermType.STRING and not term.converted]
+    for content in sites:
+        if content not in strings:
+            strings[content] = string_address
+            string_address += len(content) + 1
+    assert string_address <= STRINGS_FLAG_ADDRESS, (
+        f"Строковые литералы занимают {string_address} ячеек, доступно {STRINGS_FLAG_ADDRESS}"
+    )
+    inline = sum(len(string_stores(content, 0)) + 1 + len(PRINT_LOOP) for content in sites)
+    shared = 2 * len(sites) + len(PRINT_STRING) + len(init_strings())
+    print_routine = shared < inline
+
+
+def is_runtime_call(opcode: Opcode) -> bool:
+    return bool(opcode.params) and opcode.params[0].param_type is OpcodeParamType.RUNTIME
+
+
+def init_strings() -> list[Opcode]:
+    """Запись строковых литералов в память данных при первом вызове.
+
+    Признак записи -- ячейка `STRINGS_FLAG_ADDRESS`, после записи в ней 1. Повторная запись безопасна, поэтому
+    обработчик прерывания, прервавший запись, может начать её заново.
+    """
+    stores = [opcode for content, address in strings.items() for opcode in string_stores(content, address)]
+    return [
+        Opcode(OpcodeType.PUSH, const(STRINGS_FLAG_ADDRESS)),
+        Opcode(OpcodeType.LOAD, []),
+        Opcode(OpcodeType.PUSH, const(1)),
+        Opcode(OpcodeType.SUB, []),
+        Opcode(OpcodeType.ZJMP, rel(len(stores) + 4)),
+        *stores,
+        Opcode(OpcodeType.PUSH, const(1)),
+        Opcode(OpcodeType.PUSH, const(STRINGS_FLAG_ADDRESS)),
+        Opcode(OpcodeType.STORE, []),
+        Opcode(OpcodeType.RET, []),
+    ]
+
+
+# Подпрограммы библиотеки времени исполнения. Компонуются один раз после `halt` и только если вызываются.
+RUNTIME_LIBRARY: dict[str, typing.Callable[[], typing.Sequence[Opcode]]] = {
+    "print_string": lambda: PRINT_STRING,
+    "init_strings": init_strings,
+}
+
+
+def link_runtime(opcodes: list[Opcode]) -> set[int]:
+    """Дописывает в конец кода вызываемые подпрограммы библиотеки и подставляет их адреса в `call`.
+
+    Возвращает адреса начала подпрограмм: они не подставляются на место вызова.
+    """
+    entries = {}
+    address = 0
+    while address < len(opcodes):
+        opcode = opcodes[address]
+        address += 1
+        if not is_runtime_call(opcode):
+            continue
+        param = opcode.params[0]
+        if param.value not in entries:
+            entries[param.value] = len(opcodes)
+            for routine_opcode in map(instantiate, RUNTIME_LIBRARY[param.value]()):
+                params = routine_opcode.params
+                if params and params[0].param_type is OpcodeParamType.ADDR_REL:
+                    params[0].param_type, params[0].value = OpcodeParamType.CONST, params[0].value + len(opcodes)
+                opcodes.append(routine_opcode)
+        param.param_type = OpcodeParamType.CONST
+        param.value = entries[param.value]
+    return set(entries.values())
+
+
+# Параметры, которые генерация кода и компоновка исправляют на месте
+PATCHED_PARAMS = (OpcodeParamType.UNDEFINED, OpcodeParamType.ADDR_REL, OpcodeParamType.RUNTIME)
+
+
+def instantiate(opcode: Opcode) -> Opcode:
+    """Опкод шаблона для кода программы. Опкоды с исправляемыми параметрами копируются, остальные (без параметров
+    или с константой) разделяются всеми термами: последующие проходы их не меняют.
+
+    >>> reset()
+    >>> code = translate(": w 1 if 2 else 3 then ; w w")
+    >>> {param.value for template in TERM_TEMPLATES.values() for opcode in template for param in opcode.params}
+    {None}
+    >>> instantiate(TERM_TEMPLATES[TermType.DUP][0]) is TERM_TEMPLATES[TermType.DUP][0]
+    True
+    """
+    if not opcode.params or opcode.params[0].param_type not in PATCHED_PARAMS:
+        return opcode
+    return Opcode(opcode.opcode_type, [OpcodeParam(param.param_type, param.value) for param in opcode.params])
+
+
+def term2opcodes(term: Term) -> tuple[Opcode, ...] | list[Opcode]:
+    template = TERM_TEMPLATES.get(term.term_type)
+    if template is None:
         return fix_literal(term)
-
-    return opcodes
+    return template
 
 
-def fix_addresses(term_opcodes: list[list[Opcode]]) -> list[Opcode]:
-    result_opcodes = []
-    pref_sum = [0]
-    for term_num, opcodes in enumerate(term_opcodes):
-        term_opcode_cnt = len(opcodes)
-        pref_sum.append(pref_sum[term_num] + term_opcode_cnt)
-    for term_opcode in list(filter(lambda x: x is not None, term_opcodes)):
-        for opcode in term_opcode:
-            for param_num, param in enumerate(opcode.params):
-                if param.param_type is OpcodeParamType.ADDR:
-                    opcode.params[param_num].value = pref_sum[param.value]
-                    opcode.params[param_num].param_type = OpcodeParamType.CONST
-                if param.param_type is OpcodeParamType.ADDR_REL:
-                    opcode.params[param_num].value = len(result_opcodes) + opcode.params[param_num].value
-                    opcode.params[param_num].param_type = OpcodeParamType.CONST
-            result_opcodes.append(opcode)
-    return result_opcodes
+def emit_code(terms: list[Term]) -> list[Opcode]:
+    code = []
+    term_addresses = [0] * (len(terms) + 1)
+    patches = []
+    for term_index, term in enumerate(terms):
+        term_addresses[term_index] = len(code)
+        for opcode in map(instantiate, term2opcodes(term)):
+            if opcode.params:
+                param = opcode.params[0]
+                if param.param_type is OpcodeParamType.UNDEFINED and term.operand:
+                    param.param_type, param.value = OpcodeParamType.ADDR, term.operand
+                    patches.append(param)
+                elif param.param_type is OpcodeParamType.ADDR_REL:
+                    param.param_type, param.value = OpcodeParamType.CONST, param.value + len(code)
+            code.append(opcode)
+    term_addresses[len(terms)] = len(code)
+    for param in patches:
+        param.param_type = OpcodeParamType.CONST
+        param.value = term_addresses[param.value]
+    return code
 
 
 def fix_interrupt(terms: list[Term]) -> list[Term]:
@@ -348,17 +491,37 @@ def fix_interrupt(terms: list[Term]) -> list[Term]:
     return [*[terms[0]], *terms_interrupt_proc, *terms_not_interrupt_proc]
 
 
-def terms_to_opcodes(terms: list[Term]) -> list[Opcode]:
+def terms_to_opcodes(
+    terms: list[Term],
+    inline_size: int = 0,
+    loop_inline_size: int = 0,
+    tail_calls: bool = False,
+    peephole: bool = False,
+) -> list[Opcode]:
+    global call_report, pure_words
     terms = fix_interrupt(terms)
-    opcodes = list(map(term2opcodes, terms))
-    opcodes = fix_addresses(opcodes)
-    return [*opcodes, Opcode(OpcodeType.HALT, [])]
+    allocate_strings(terms)
+    opcodes = emit_code(terms)
+    opcodes.append(Opcode(OpcodeType.HALT, []))
+    runtime = link_runtime(opcodes)
+    opcodes, call_report = optimize_calls(opcodes, inline_size, loop_inline_size, tail_calls, runtime)
+    if peephole:
+        # Последовательности, выданные term2opcodes и fix_literal, и тела подставленных слов
+        opcodes, call_report["peephole_rewrites"] = optimize_sequences(opcodes)
+    pure_words = find_pure_words(opcodes)
+    return opcodes
 
 
-def translate(source_code: str) -> list[dict]:
+def translate(
+    source_code: str,
+    inline_size: int = INLINE_SIZE,
+    loop_inline_size: int = LOOP_INLINE_SIZE,
+    tail_calls: bool = True,
+    peephole: bool = True,
+) -> list[dict]:
     terms = split_to_terms(source_code)
     validate_and_correct_terms(terms)
-    opcodes = terms_to_opcodes(terms)
+    opcodes = terms_to_opcodes(terms, inline_size, loop_inline_size, tail_calls, peephole)
     commands = []
     for index, opcode in enumerate(opcodes):
         command = {
@@ -367,18 +530,27 @@ def translate(source_code: str) -> list[dict]:
         }
         if len(opcode.params):
             command["arg"] = int(opcode.params[0].value)
+        if index in pure_words:
+            command["pure"] = list(pure_words[index])
         commands.append(command)
     return commands
 
 
-def main(source_file: str, target_file: str) -> None:
-    global variables, variable_address, string_address, functions
+def reset() -> None:
+    global variables, variable_address, string_address, strings, print_routine, functions, call_report, pure_words
 
     variables = {}
-    variable_address = 512
+    variable_address = VARIABLES_ADDRESS
     string_address = 0
+    strings = {}
+    print_routine = False
     functions = {}
+    call_report = {}
+    pure_words = {}
+
 
+def main(source_file: str, target_file: str) -> None:
+    reset()
     with open(source_file, encoding="utf-8") as f:
         source_code = f.read()
     code = translate(source_code)
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import math
+import sys
+import typing
+
+from isa import OpcodeType, read_code
+from machine import ControlUnit, DataPath
+
+# Номер такта, с которого модель не пишет трассу: замеры стоимости команд не должны попадать в журнал
+QUIET_TICK = 1 << 20
+BRANCH_COMMANDS = (OpcodeType.JMP, OpcodeType.ZJMP, OpcodeType.LOOP)
+EXIT_COMMANDS = (OpcodeType.RET, OpcodeType.HALT)
+
+
+def measure(command: OpcodeType, setup: typing.Callable[[ControlUnit], None] | None = None) -> int:
+    """Число тактов, которое `ControlUnit` тратит на команду `command`."""
+    data_path = DataPath(2048, 16, 16, [])
+    control_unit = ControlUnit(data_path, 1)
+    control_unit.tick_number = QUIET_TICK
+    control_unit.IO = "a"
+    control_unit.message_port = lambda target, value, tick_number: None
+    data_path.sp, data_path.i = 8, 8
+    data_path.top_of_stack, data_path.next = 1, 1
+    control_unit.program_memory[0] = {"index": 0, "command": command, "arg": 0}
+    if setup is not None:
+        setup(control_unit)
+    try:
+        control_unit.decode_execute()
+    except StopIteration:
+        pass
+    return control_unit.tick_number - QUIET_TICK
+
+
+def set_loop(index: int, limit: int, depth: int) -> typing.Callable[[ControlUnit], None]:
+    def setup(control_unit: ControlUnit) -> None:
+        data_path = control_unit.data_path
+        data_path.loop_index, data_path.loop_limit, data_path.loop_depth = index, limit, depth
+
+    return setup
+
+
+def set_block(count: int) -> typing.Callable[[ControlUnit], None]:
+    def setup(control_unit: ControlUnit) -> None:
+        # `type` снимает порт, после чего длина блока оказывается на вершине стека
+        control_unit.data_path.next = count
+
+    return setup
+
+
+def measure_interrupt_entry() -> int:
+    data_path = DataPath(16, 16, 16, [(0, "a")])
+    control_unit = ControlUnit(data_path, 1)
+    control_unit.tick_number = QUIET_TICK
+    data_path.sp, data_path.i = 8, 8
+    control_unit.find_interrupt()
+    return control_unit.tick_number - QUIET_TICK
+
+
+class TickCosts:
+    """Такты команд, измеренные на `ControlUnit`. Для команд, чья длительность зависит от состояния,
+    берётся худший случай; у `loop` отдельно хранится стоимость перехода на следующую итерацию,
+    у `type` -- стоимость пустого блока и каждого символа."""
+
+    def __init__(self):
+        self.commands = {command: measure(command) for command in OpcodeType}
+        self.commands[OpcodeType.DO] = max(measure(OpcodeType.DO, set_loop(0, 0, depth)) for depth in (0, 1))
+        self.commands[OpcodeType.LOOP] = max(measure(OpcodeType.LOOP, set_loop(0, 0, depth)) for depth in (1, 2))
+        self.loop_taken = measure(OpcodeType.LOOP, set_loop(0, 10, 1))
+        self.commands[OpcodeType.TYPE] = measure(OpcodeType.TYPE, set_block(0))
+        self.block_char = measure(OpcodeType.TYPE, set_block(1)) - self.commands[OpcodeType.TYPE]
+        self.interrupt_entry = measure_interrupt_entry()
+
+
+def find_words(code: list[dict]) -> set[int]:
+    """Адреса начала слов: цели `call`, обработчик прерывания и определения вида `jmp L; тело; ret; L:`."""
+    words = {cell["arg"] for cell in code if cell["command"] == OpcodeType.CALL}
+    if code and code[0]["command"] == OpcodeType.JMP and code[0]["arg"] > 1:
+        words.add(1)
+    for address, cell in enumerate(code[:-1]):
+        if (
+            cell["command"] == OpcodeType.JMP
+            and cell["arg"] > address + 1
+            and code[cell["arg"] - 1]["command"] == OpcodeType.RET
+        ):
+            words.add(address + 1)
+    return words
+
+
+def string_lengths(code: list[dict]) -> dict[int, int]:
+    """Константы, записываемые в память последовательностью `push C; push A; store`: адрес -> наибольшая C."""
+    lengths = {}
+    for address in range(2, len(code)):
+        first, second, store = code[address - 2 : address + 1]
+        if store["command"] == OpcodeType.STORE and first["command"] == second["command"] == OpcodeType.PUSH:
+            lengths[second["arg"]] = max(lengths.get(second["arg"], 0), first["arg"])
+    return lengths
+
+
+class Estimator:
+    """Статическая оценка худшего числа тактов для слов и программы.
+
+    Граф потока управления строится по переведённому коду: переходы вперёд образуют ациклический граф,
+    переходы назад -- циклы (тело цикла -- отрезок адресов от цели перехода до него). Цикл заменяется
+    одной вершиной стоимостью `итераций * худшая итерация`. Число итераций берётся из констант перед
+    `do` (`push L; push S; do` -- `max(1, L - S)`), из длины строки для цикла печати строки (строки, адрес
+    которой кладётся перед циклом, или наибольшей из строк, адреса которых передаются подпрограмме печати) или из `bounds` (адрес начала цикла -> наибольшее число итераций). `call` стоит столько же, сколько
+    худший путь вызываемого слова, `jmp` на начало слова -- хвостовой вызов.
+
+    Циклы без оценки и рекурсия дают бесконечную оценку и попадают в `unbounded`.
+    """
+
+    def __init__(self, code: list[dict], bounds: dict[int, int] | None = None, costs: TickCosts | None = None):
+        self.code = [{**cell, "command": OpcodeType(cell["command"])} for cell in code]
+        self.costs = costs or TickCosts()
+        self.words = find_words(self.code)
+        self.strings = string_lengths(self.code)
+        self.bounds = bounds or {}
+        self.loops = {}
+        for address, cell in enumerate(self.code):
+            target = cell.get("arg")
+            if cell["command"] in BRANCH_COMMANDS and target <= address and not self.is_tail_call(cell):
+                self.loops[target] = max(self.loops.get(target, address), address)
+        self.unbounded = {}
+        self.word_ticks = {}
+        self.in_progress = set()
+
+    def is_tail_call(self, cell: dict) -> bool:
+        return cell["command"] == OpcodeType.JMP and cell["arg"] in self.words
+
+    def command_ticks(self, address: int) -> float:
+        """Такты команды. Длина блока `type` берётся из константы: `push N; push P; type`."""
+        cell = self.code[address]
+        if cell["command"] != OpcodeType.TYPE:
+            return self.costs.commands[cell["command"]]
+        count = self.code[address - 2] if address >= 2 else {}
+        if count.get("command") != OpcodeType.PUSH or self.code[address - 1]["command"] != OpcodeType.PUSH:
+            self.unbounded[address] = f"type {address}: block length unknown"
+            return math.inf
+        return self.costs.commands[OpcodeType.TYPE] + count["arg"] * self.costs.block_char
+
+    def next_addresses(self, address: int) -> list[int]:
+        cell = self.code[address]
+        if cell["command"] in EXIT_COMMANDS or self.is_tail_call(cell):
+            return []
+        if cell["command"] == OpcodeType.JMP:
+            return [cell["arg"]]
+        if cell["command"] in BRANCH_COMMANDS:
+            return [address + 1, cell["arg"]]
+        return [address + 1]
+
+    def successors(self, address: int) -> list[tuple[int | None, float]]:
+        """Переходы из команды: `(адрес, такты)`, адрес `None` -- выход из слова."""
+        cell = self.code[address]
+        ticks = self.command_ticks(address)
+        if cell["command"] in EXIT_COMMANDS:
+            return [(None, ticks)]
+        if self.is_tail_call(cell):
+            return [(None, ticks + self.word(cell["arg"]))]
+        if cell["command"] == OpcodeType.CALL:
+            return [(address + 1, ticks + self.word(cell["arg"]))]
+        if cell["command"] == OpcodeType.LOOP:
+            return [(address + 1, ticks), (cell["arg"], self.costs.loop_taken)]
+        return [(target, ticks) for target in self.next_addresses(address)]
+
+    def reachable(self, entry: int) -> set[int]:
+        nodes, stack = set(), [entry]
+        while stack:
+            address = stack.pop()
+            if address not in nodes and address < len(self.code):
+                nodes.add(address)
+                stack.extend(self.next_addresses(address))
+        return nodes
+
+    def string_arguments(self, entry: int) -> list[int]:
+        """Длины строк, адреса которых кладутся на стек перед каждым вызовом слова `entry`.
+
+        Пустой список, если хотя бы перед одним вызовом адрес строки неизвестен.
+        """
+        lengths = []
+        for address, cell in enumerate(self.code):
+            if cell["command"] in (OpcodeType.CALL, OpcodeType.JMP) and cell["arg"] == entry and address > 0:
+                argument = self.code[address - 1]
+                if argument["command"] != OpcodeType.PUSH or argument["arg"] not in self.strings:
+                    return []
+                lengths.append(self.strings[argument["arg"]])
+        return lengths
+
+    def loop_bound(self, header: int) -> float:
+        """Наибольшее число исполнений начала цикла."""
+        if header in self.bounds:
+            return self.bounds[header]
+        before = self.code[max(0, header - 3) : header]
+        commands = [cell["command"] for cell in before]
+        if commands == [OpcodeType.PUSH, OpcodeType.PUSH, OpcodeType.DO]:
+            return max(1, before[0]["arg"] - before[1]["arg"])
+        if commands == [OpcodeType.POP, OpcodeType.DUP, OpcodeType.LOAD]:
+            # Цикл печати строки: счётчик -- длина строки, последняя проверка выходит из цикла. Адрес строки
+            # кладётся перед циклом (`push A; swap; pop; dup; load`) или передаётся подпрограмме печати
+            string = self.code[header - 5] if header >= 5 else {}
+            if string.get("command") == OpcodeType.PUSH and string["arg"] in self.strings:
+                return self.strings[string["arg"]] + 1
+            lengths = self.string_arguments(max((entry for entry in self.words if entry <= header), default=0))
+            if lengths:
+                return max(lengths) + 1
+        self.unbounded[header] = f"loop {header}..{self.loops[header]}: iteration count unknown"
+        return math.inf
+
+    def longest(
+        self, start: int, nodes: set[int], header: int | None = None, terminal: frozenset = frozenset()
+    ) -> tuple[list[tuple[int | None, float]], float]:
+        """Худшие пути от начала `start` по командам `nodes` с заменой вложенных циклов одной вершиной.
+
+        Возвращает выходы из `nodes` `(адрес или None, такты)` и худшее время до перехода на `header`.
+        """
+        before = {start: 0}
+        exits, back, skip = [], -math.inf, set()
+        for address in sorted(nodes):
+            if address not in before or address in skip:
+                continue
+            if address in self.loops and address != header:
+                body = {node for node in nodes if address <= node <= self.loops[address]}
+                skip |= body
+                edges = self.loop_exits(address, body)
+            else:
+                edges = self.successors(address)
+            for target, ticks in edges:
+                total = before[address] + ticks
+                if target is not None and target == header:
+                    back = max(back, total)
+                elif target is None or target not in nodes or address in terminal:
+                    exits.append((target, total))
+                else:
+                    before[target] = max(before.get(target, -math.inf), total)
+        return exits, back
+
+    def loop_exits(self, header: int, body: set[int]) -> list[tuple[int | None, float]]:
+        exits, iteration = self.longest(header, body, header)
+        repeats = self.loop_bound(header) - 1
+        if iteration == math.inf:
+            repeated = math.inf
+        elif repeats == 0 or iteration <= 0:
+            # Без повторов (или без пути на следующую итерацию) произведение не считается: 0 * inf -- это NaN
+            repeated = 0
+        else:
+            repeated = repeats * iteration
+        return [(target, ticks + repeated) for target, ticks in exits]
+
+    def word(self, entry: int) -> float:
+        """Худшее число тактов от входа в слово до выхода из него."""
+        if entry in self.word_ticks:
+            return self.word_ticks[entry]
+        if entry in self.in_progress:
+            self.unbounded[entry] = f"word {entry}: recursion"
+            return math.inf
+        self.in_progress.add(entry)
+        exits, _ = self.longest(entry, self.reachable(entry))
+        self.in_progress.discard(entry)
+        self.word_ticks[entry] = max((ticks for _, ticks in exits), default=0)
+        return self.word_ticks[entry]
+
+    def disabled(self, entry: int) -> float:
+        """Худшее время с запрещёнными прерываниями внутри слова: от `di` до `ei` или выхода из слова."""
+        nodes = self.reachable(entry)
+        enables = frozenset(address for address in nodes if self.code[address]["command"] == OpcodeType.EI)
+        worst = 0
+        for address in sorted(nodes):
+            if self.code[address]["command"] == OpcodeType.DI:
+                region = {node for node in nodes if node >= address}
+                exits, _ = self.longest(address, region, terminal=enables)
+                worst = max([worst, *(ticks for _, ticks in exits)])
+        return worst
+
+    def report(self) -> dict:
+        result = {"main": self.word(0)}
+        for entry in sorted(self.words):
+            result[f"word@{entry}"] = self.word(entry)
+        handler = 1 in self.words
+        code_nodes = set().union(*(self.reachable(entry) for entry in [0, *self.words]))
+        longest_command = max(self.command_ticks(address) for address in code_nodes)
+        disabled = max(self.disabled(entry) for entry in [0, *self.words])
+        result["interrupt_entry"] = self.costs.interrupt_entry
+        result["longest_command"] = longest_command
+        result["max_disabled"] = disabled
+        if handler:
+            # Токен ждёт конца текущей команды, участка с запрещёнными прерываниями или обработки
+            # предыдущего токена, после чего обработчик исполняется целиком
+            wait = max(longest_command, disabled, result["word@1"])
+            result["handler_latency"] = self.costs.interrupt_entry + wait
+            result["handler_response"] = result["handler_latency"] + result["word@1"]
+        return result
+
+
+def estimate(code: list[dict], bounds: dict[int, int] | None = None) -> tuple[dict, list[str]]:
+    """Оценки тактов и список путей, которые не удалось ограничить.
+
+    >>> import translator
+    >>> translator.reset()
+    >>> code = translator.translate(':intr h 0 read 11 emit ei ; : twice dup + ; 3 0 do i twice drop loop 11 ." hi"')
+    >>> report, unbounded = estimate(code)
+    >>> report["main"], report["word@1"], report["handler_latency"], unbounded
+    (181, 17, 19, [])
+    >>> from machine import simulation
+    >>> simulation(code, 10000, [])[2] <= report["main"]
+    True
+    >>> code = translator.translate(': hi 11 ." hi" ; hi 11 ." yo"')
+    >>> report, unbounded = estimate(code)
+    >>> simulation(code, 10000, [])[2] <= report["main"], unbounded
+    (True, [])
+    >>> estimate(translator.translate("begin 1 until"))[1]
+    ['loop 1..2: iteration count unknown']
+    >>> report, unbounded = estimate(translator.translate("variable c 1 0 do 0 c ! begin c @ 1 + dup c ! 1 = until loop"))
+    >>> report["main"], unbounded
+    (inf, ['loop 7..16: iteration count unknown'])
+    """
+    estimator = Estimator(code, bounds)
+    report = estimator.report()
+    return report, [estimator.unbounded[address] for address in sorted(estimator.unbounded)]
+
+
+def main(code_file: str, bounds: dict[int, int]) -> None:
+    report, unbounded = estimate(read_code(code_file), bounds)
+    for key, value in report.items():
+        print(f"{key:>18}: {'unbounded' if value == math.inf else value}")
+    for reason in unbounded:
+        print(f"unbounded {reason}")
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 2, "Неверные аргументы: wcet.py <code_file> [<loop_address>=<iterations>...]"
+    main(sys.argv[1], {int(key): int(value) for key, value in (pair.split("=") for pair in sys.argv[2:])})
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import random
+import string
+import sys
+
+from translator import STRINGS_FLAG_ADDRESS
+
+ALPHABET = string.ascii_lowercase
+DISTRIBUTIONS = ("fixed", "poisson", "bursty", "overload")
+# Одно обслуживание прерывания в cat.fth занимает около 30 тактов
+HANDLER_TICKS = 30
+# Самый короткий литерал занимает две ячейки области строк: длину и символ
+MAX_STRING_LITERALS = STRINGS_FLAG_ADDRESS // 2
+
+
+def arrival_gaps(rng: random.Random, distribution: str, count: int, gap: int, burst: int) -> list[int]:
+    if distribution == "fixed":
+        return [gap] * count
+    if distribution == "poisson":
+        return [max(1, round(rng.expovariate(1 / gap))) for _ in range(count)]
+    if distribution == "bursty":
+        # Пачки по `burst` токенов подряд, между пачками в среднем `gap * burst` тактов
+        return [max(1, round(rng.expovariate(1 / (gap * burst)))) if idx % burst == 0 else 1 for idx in range(count)]
+    if distribution == "overload":
+        # Токены приходят быстрее, чем обработчик успевает их обслужить
+        return [rng.randint(1, HANDLER_TICKS // 2) for _ in range(count)]
+    raise ValueError(distribution)
+
+
+def generate_schedule(
+    distribution: str, count: int, seed: int = 0, gap: int = 40, burst: int = 16, start: int = 30
+) -> list[tuple[int, str]]:
+    """Расписание токенов ввода `(такт, символ)`. Последний токен -- перевод строки.
+
+    >>> generate_schedule("fixed", 3, gap=10)
+    [(30, 'm'), (40, 'y'), (50, '\\n')]
+    >>> generate_schedule("poisson", 1000, seed=7) == generate_schedule("poisson", 1000, seed=7)
+    True
+    """
+    assert count > 0, "Количество токенов должно быть > 0"
+    assert distribution in DISTRIBUTIONS, f"Неизвестное распределение: {distribution}"
+    rng = random.Random(seed)
+    gaps = arrival_gaps(rng, distribution, count - 1, gap, burst)
+    chars = [rng.choice(ALPHABET) for _ in range(count - 1)]
+    schedule = []
+    tick = start
+    for char, next_gap in zip([*chars, "\n"], [*gaps, 0]):
+        schedule.append((tick, char))
+        tick += next_gap
+    return schedule
+
+
+def nested_loops(size: int, rng: random.Random) -> str:
+    """`size` вложенных циклов со случайным числом итераций, печатает общее число итераций."""
+    limits = [rng.randint(2, 4) for _ in range(size)]
+    loops = " ".join(f"{limit} 0 do" for limit in limits)
+    return f"0 {loops} 1 +{' loop' * size} ."
+
+
+def many_words(size: int, rng: random.Random) -> str:
+    """`size` слов, каждое четвёртое вызывает одно из предыдущих, печатает итоговую сумму."""
+    words = [": w0 1 + ;"]
+    for idx in range(1, size):
+        words.append(f": w{idx} {rng.randint(1, 9)} + {f'w{rng.randrange(idx)} ' if idx % 4 == 0 else ''};")
+    calls = " ".join(f"w{idx}" for idx in range(size))
+    return "\n".join([*words, f"0 {calls} ."])
+
+
+def many_strings(size: int, rng: random.Random) -> str:
+    """`size` строковых литералов длиной до 20 символов. Строки (длина и символы) должны поместиться в область
+    строк памяти данных -- ячейки до `STRINGS_FLAG_ADDRESS`, за ней переменные. Поэтому при `size` больше
+    `STRINGS_FLAG_ADDRESS // 21` максимальная длина уменьшается, а литералов не больше `MAX_STRING_LITERALS`
+    (по ячейке на длину и символ).
+
+    >>> import translator
+    >>> translator.reset()
+    >>> len(translator.translate(generate_program("many_strings", 40))) > 0
+    True
+    >>> translator.reset()
+    >>> len(translator.translate(generate_program("many_strings", MAX_STRING_LITERALS))) > 0
+    True
+    >>> generate_program("many_strings", MAX_STRING_LITERALS + 1)  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    AssertionError: Строковых литералов больше 255...
+    """
+    assert 0 < size <= MAX_STRING_LITERALS, f"Строковых литералов больше {MAX_STRING_LITERALS}"
+    max_length = min(20, STRINGS_FLAG_ADDRESS // size - 1)
+    lengths = [rng.randint(1, max_length) for _ in range(size)]
+    return "\n".join(
+        '11 ." ' + rng.choice(ALPHABET) + "".join(rng.choice(ALPHABET + " ") for _ in range(length - 1)) + '"'
+        for length in lengths
+    )
+
+
+TEMPLATES = {"nested_loops": nested_loops, "many_words": many_words, "many_strings": many_strings}
+
+
+def generate_program(template: str, size: int, seed: int = 0) -> str:
+    assert template in TEMPLATES, f"Неизвестный шаблон: {template}"
+    return TEMPLATES[template](size, random.Random(seed))
+
+
+def write_schedule(target_file: str, schedule: list[tuple[int, str]]) -> None:
+    with open(target_file, "w", encoding="utf-8") as file:
+        file.write("[" + ", ".join(f"({tick}, {char!r})" for tick, char in schedule) + "]")
+
+
+def main(kind: str, name: str, target_file: str, options: dict[str, int]) -> None:
+    if kind == "input":
+        write_schedule(target_file, generate_schedule(name, **options))
+    else:
+        with open(target_file, "w", encoding="utf-8") as file:
+            file.write(generate_program(name, **options))
+
+
+if __name__ == "__main__":
+    assert len(sys.argv) >= 4, (
+        "Неверные аргументы: workload.py input <fixed|poisson|bursty|overload> <target_file> count=N [seed= gap= burst=]"
+        " | workload.py program <nested_loops|many_words|many_strings> <target_file> size=N [seed=]"
+    )
+    _, kind, name, target, *pairs = sys.argv
+    main(kind, name, target, {key: int(value) for key, value in (pair.split("=") for pair in pairs)})